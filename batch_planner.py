@@ -0,0 +1,163 @@
+import argparse
+import hashlib
+import json
+import os
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, Iterator, Optional, Set, Tuple
+
+from dotenv import load_dotenv
+
+import config
+from cli_interface import get_initial_state
+from state_definitions import PlannerState
+from tracing import dump_trace
+from usage_ledger import ledger, usage_scope
+from workflow_engine import create_workflow
+
+# Fields copied from a finished workflow into the output record
+OUTPUT_FIELDS = [
+    "city", "interests", "budget", "duration", "travel_style",
+    "itinerary", "recommendations", "local_tips", "safety_info", "alternative_plans",
+]
+
+
+def request_id(record: dict) -> str:
+    """Stable id for a trip request: its ``id`` field, or a digest of its contents"""
+    if record.get("id"):
+        return str(record["id"])
+    payload = json.dumps(record, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def build_state(record: dict) -> PlannerState:
+    """Pre-filled workflow state from one JSONL trip request"""
+    state = get_initial_state()
+    for field in state:
+        if field in record and field != "messages":
+            state[field] = record[field]
+    if isinstance(state["interests"], str):
+        state["interests"] = [i.strip() for i in state["interests"].split(",") if i.strip()]
+    return state
+
+
+def completed_ids(output_path: str) -> Set[str]:
+    """Ids already planned successfully in a previous run's output"""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # Partially written line from an interrupted run
+            if result.get("status") == "ok":
+                done.add(result["id"])
+    return done
+
+
+def read_requests(input_path: str, skip: Set[str]) -> Iterator[Tuple[str, Optional[dict], Optional[str]]]:
+    """Trip requests from a JSONL file that still need planning.
+
+    Yields ``(id, record, None)``, or ``(id, None, error)`` for a line that
+    is not a JSON object; such a line is identified by a digest of its text.
+    """
+    with open(input_path, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                record, error = None, f"Line {number} is not valid JSON: {e}"
+            else:
+                error = None if isinstance(record, dict) else f"Line {number} is not a JSON object"
+            if error is not None:
+                yield hashlib.sha256(line.strip().encode("utf-8")).hexdigest()[:16], None, error
+                continue
+            rid = request_id(record)
+            if rid not in skip:
+                yield rid, record, None
+
+
+def plan_one(app, rid: str, record: dict) -> dict:
+    """Run the headless workflow for one request"""
+    try:
+        with usage_scope(rid):
+            final_state = app.invoke(build_state(record))
+    except Exception as e:
+        return {"id": rid, "status": "error", "error": str(e), "usage": ledger.session_usage(rid)}
+    return {
+        "id": rid,
+        "status": "ok",
+        **{field: final_state.get(field) for field in OUTPUT_FIELDS},
+        "usage": ledger.session_usage(rid),
+    }
+
+
+def run_batch(input_path: str, output_path: str, workers: int = config.BATCH_WORKERS) -> Dict[str, int]:
+    """Plan every request in ``input_path``, appending results to ``output_path``.
+
+    Results are written as soon as each workflow finishes. Requests that
+    already have a successful result in ``output_path`` are skipped, so an
+    interrupted run resumes where it stopped. Malformed input lines get an
+    error record instead of stopping the batch.
+    """
+    # Node progress output is for interactive runs only
+    console_output, config.CONSOLE_OUTPUT = config.CONSOLE_OUTPUT, False
+    try:
+        app = create_workflow(interactive=False)
+        skip = completed_ids(output_path)
+        counts = {"ok": 0, "error": 0, "skipped": len(skip)}
+
+        with open(output_path, "a", encoding="utf-8") as out, ThreadPoolExecutor(max_workers=workers) as pool:
+            pending = set()
+
+            def write(result: dict):
+                out.write(json.dumps(result, ensure_ascii=False) + "\n")
+                out.flush()
+                counts[result["status"]] += 1
+                print(f"{'✅' if result['status'] == 'ok' else '❌'} {result['id']}", flush=True)
+
+            def drain(return_when):
+                nonlocal pending
+                done, pending = wait(pending, return_when=return_when)
+                for future in done:
+                    write(future.result())
+
+            for rid, record, error in read_requests(input_path, skip):
+                if error is not None:
+                    write({"id": rid, "status": "error", "error": error})
+                    continue
+                # Keep the queue short so thousands of requests never sit in memory at once
+                if len(pending) >= workers * 2:
+                    drain(FIRST_COMPLETED)
+                pending.add(pool.submit(plan_one, app, rid, record))
+            if pending:
+                drain(ALL_COMPLETED)
+    finally:
+        config.CONSOLE_OUTPUT = console_output
+
+    return counts
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Plan trips headlessly from a JSONL file of requests")
+    parser.add_argument("input", help="JSONL file with one set of PlannerState fields per line")
+    parser.add_argument("output", help="JSONL file that completed plans are appended to")
+    parser.add_argument("--workers", type=int, default=config.BATCH_WORKERS,
+                        help="workflows to run concurrently")
+    args = parser.parse_args()
+
+    counts = run_batch(args.input, args.output, args.workers)
+    print(f"\n🧭 Planned {counts['ok']} trips, {counts['error']} failed, "
+          f"{counts['skipped']} already done")
+    if config.TRACE_DUMP_PATH:
+        print(f"🧭 Trace written to {dump_trace()}")
+    if config.USAGE_EXPORT_PATH:
+        print(f"📒 Usage written to {ledger.export()}")
+
+
+if __name__ == "__main__":
+    main()
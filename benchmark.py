@@ -0,0 +1,343 @@
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+from unittest import mock
+
+# Measure the app itself rather than Groq's rate limits or a warm response
+# cache; explicit environment settings still take precedence
+os.environ.setdefault("LLM_REQUESTS_PER_SECOND", "10000")
+os.environ.setdefault("LLM_BURST", "10000")
+os.environ.setdefault("LLM_INITIAL_CONCURRENCY", "64")
+os.environ.setdefault("LLM_MAX_CONCURRENCY", "256")
+os.environ.setdefault("RESPONSE_CACHE_PATH", os.path.join(tempfile.mkdtemp(prefix="chaotic-bench-"), "responses.sqlite3"))
+os.environ.setdefault("RESPONSE_CACHE_TTL_SECONDS", "0")
+os.environ.setdefault("CONSOLE_OUTPUT", "false")
+
+import metrics
+from fake_chat_model import FakeChatModel, FakeLLMProfile
+from llm_provider import set_llm_factory
+
+CITIES = ["Tokyo", "Paris", "Lisbon", "Mexico City", "Seoul", "Marrakech", "Istanbul", "Hanoi"]
+
+# Answers to the CLI prompts, in order: trip details, a day-level refinement,
+# a budget refinement, then approval
+CLI_SCRIPT = [
+    "{city}", "food, museums, nightlife", "mid-range", "3 days", "adventurous", "2",
+    "hostel", "public transit", "none",
+    "modify", "day 2", "more street food",
+    "modify", "budget", "luxury",
+    "yes",
+]
+
+# Relative change that counts as a regression against the baseline
+DEFAULT_TOLERANCE = 0.15
+DEFAULT_BASELINE = "benchmark_baseline.json"
+
+
+def _percentiles(samples: List[float]) -> Dict[str, float]:
+    ordered = sorted(samples)
+    if not ordered:
+        return {}
+    pick = lambda fraction: ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+    return {"mean": sum(ordered) / len(ordered), "p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99)}
+
+
+def _peak_rss_mb() -> float:
+    # Peak for the whole process, which is why each scenario runs in its own one.
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def _span_latencies() -> Dict[str, Dict[str, float]]:
+    """p50/p95 of every traced node and LLM call recorded during the scenario"""
+    return {
+        name[: -len(".duration")]: {"p50": stats["p50"], "p95": stats["p95"], "count": stats["count"]}
+        for name, stats in metrics.snapshot().items()
+        if name.endswith(".duration") and name.startswith(("node.", "llm."))
+    }
+
+
+# A scenario's setup (imports, building the app) returns the run that is timed
+Run = Callable[[], Tuple[List[float], int]]
+
+
+def measure(name: str, setup: Callable[[], Run], trace_memory: bool) -> dict:
+    """Set up one scenario, then time its runs and summarise latencies, throughput and memory.
+
+    Setup is reported as ``startup_s`` and kept out of the latency and
+    throughput figures.
+    """
+    started = time.perf_counter()
+    run = setup()
+    startup = time.perf_counter() - started
+    metrics.reset()
+    if trace_memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    latencies, errors = run()
+    elapsed = time.perf_counter() - started
+    result = {
+        "runs": len(latencies),
+        "errors": errors,
+        "latency": _percentiles(latencies),
+        "throughput_per_s": len(latencies) / elapsed if elapsed else 0.0,
+        "startup_s": startup,
+        "peak_rss_mb": _peak_rss_mb(),
+        "spans": _span_latencies(),
+    }
+    if trace_memory:
+        result["peak_traced_mb"] = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+        tracemalloc.stop()
+    print(f"✅ {name}: {result['runs']} runs, {errors} errors, "
+          f"p50 {result['latency'].get('p50', 0):.3f}s, p95 {result['latency'].get('p95', 0):.3f}s, "
+          f"{result['throughput_per_s']:.2f}/s (startup {startup:.2f}s)", flush=True)
+    return result
+
+
+def _timed(call: Callable[[], object]):
+    started = time.perf_counter()
+    try:
+        call()
+        return time.perf_counter() - started, 0
+    except Exception:
+        return time.perf_counter() - started, 1
+
+
+def _collect(results) -> Tuple[List[float], int]:
+    """Latencies of the successful runs and the number of failures"""
+    latencies = [latency for latency, failed in results if not failed]
+    return latencies, sum(failed for _, failed in results)
+
+
+def bench_cli_workflow(iterations: int) -> Run:
+    """The full interactive graph, with scripted answers in place of input()"""
+    from cli_interface import get_initial_state
+    from workflow_engine import create_workflow
+
+    app = create_workflow()
+
+    def run():
+        results = []
+        for i in range(iterations):
+            answers = iter(line.format(city=CITIES[i % len(CITIES)]) for line in CLI_SCRIPT)
+            # Prompts and progress are printed unconditionally by the input nodes
+            with mock.patch("builtins.input", lambda prompt="": next(answers, "yes")), \
+                    contextlib.redirect_stdout(io.StringIO()):
+                results.append(_timed(lambda: app.invoke(get_initial_state(), {"recursion_limit": 100})))
+        return _collect(results)
+
+    return run
+
+
+def bench_headless_workflow(iterations: int, concurrency: int) -> Run:
+    """Headless graphs, as batch planning runs them, ``concurrency`` at a time"""
+    from batch_planner import build_state
+    from workflow_engine import create_workflow
+
+    app = create_workflow(interactive=False)
+    records = [
+        {"city": CITIES[i % len(CITIES)], "interests": f"food, history, trip {i}", "duration": "3 days"}
+        for i in range(iterations)
+    ]
+
+    def run():
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(lambda record: _timed(lambda: app.invoke(build_state(record))), records))
+        return _collect(results)
+
+    return run
+
+
+def bench_planner(iterations: int, concurrency: int) -> Run:
+    """TravelPlanner's sync generate_* methods for one trip per run"""
+    from travel_planner import TravelPlanner
+
+    planner = TravelPlanner()
+
+    def one_trip(i: int):
+        city = CITIES[i % len(CITIES)]
+        interests = f"art, markets, trip {i}"
+        planner.generate_itinerary(city, interests)
+        planner.generate_alternative_plans(city, interests, "3 days", "adventurous")
+        planner.generate_local_tips(city)
+        planner.generate_safety_info(city)
+
+    def run():
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(lambda i: _timed(lambda: one_trip(i)), range(iterations)))
+        return _collect(results)
+
+    return run
+
+
+def _handler(demo, name: str) -> List[Callable]:
+    return [block_fn.fn for block_fn in demo.fns.values() if getattr(block_fn.fn, "__name__", "") == name]
+
+
+def bench_gradio_handlers(iterations: int, concurrency: int) -> Run:
+    """The web submit handler plus every lazy section, ``concurrency`` sessions at a time"""
+    import gradio as gr
+    from session_history import SessionHistory
+    from travel_planner import TravelPlanner
+
+    demo = TravelPlanner().create_gradio_interface()
+    submit = _handler(demo, "enhanced_itinerary_generation")[0]
+    loaders = _handler(demo, "load_section")
+
+    async def session(i: int):
+        city = CITIES[i % len(CITIES)]
+        trip = {"city": city, "interests": f"parks, coffee, trip {i}", "duration": "3 days",
+                "travel_style": "relaxed"}
+        request = gr.Request(session_hash=f"bench-{i}")
+        started = time.perf_counter()
+        try:
+            async for _ in submit(city, trip["interests"], "mid-range", trip["duration"], trip["travel_style"],
+                                  SessionHistory(), request):
+                pass
+            for load in loaders:
+                async for _ in load(trip, {}, request):
+                    pass
+        except Exception:
+            return time.perf_counter() - started, 1
+        return time.perf_counter() - started, 0
+
+    async def run_all():
+        slots = asyncio.Semaphore(concurrency)
+
+        async def bounded(i: int):
+            async with slots:
+                return await session(i)
+
+        return await asyncio.gather(*(bounded(i) for i in range(iterations)))
+
+    return lambda: _collect(asyncio.run(run_all()))
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], tolerance: float) -> List[str]:
+    """Human-readable regressions of ``results`` against ``baseline``"""
+    regressions = []
+    for scenario, current in results.items():
+        previous = baseline.get(scenario)
+        if not previous:
+            continue
+        checks = [
+            ("p50 latency", current["latency"].get("p50"), previous["latency"].get("p50"), True),
+            ("p95 latency", current["latency"].get("p95"), previous["latency"].get("p95"), True),
+            ("throughput", current["throughput_per_s"], previous["throughput_per_s"], False),
+            ("peak RSS", current["peak_rss_mb"], previous["peak_rss_mb"], True),
+        ]
+        for label, now, before, higher_is_worse in checks:
+            if not now or not before:
+                continue
+            change = (now - before) / before
+            if (change > tolerance) if higher_is_worse else (change < -tolerance):
+                regressions.append(f"{scenario}: {label} {before:.3f} -> {now:.3f} ({change:+.0%})")
+    return regressions
+
+
+SCENARIOS = {
+    "cli_workflow": lambda args: bench_cli_workflow(args.iterations),
+    "headless_workflow": lambda args: bench_headless_workflow(args.iterations, args.concurrency),
+    "planner": lambda args: bench_planner(args.iterations, args.concurrency),
+    "gradio_handlers": lambda args: bench_gradio_handlers(args.iterations, args.concurrency),
+}
+
+
+# Options forwarded to each scenario's process
+SCENARIO_OPTIONS = ["iterations", "concurrency", "ttft", "ttft_sigma", "tokens_per_second",
+                    "reply_tokens", "error_rate", "seed"]
+
+
+def run_isolated(name: str, args: argparse.Namespace) -> dict:
+    """Run one scenario in a fresh interpreter, so its peak RSS is its own"""
+    command = [sys.executable, os.path.abspath(__file__), "--scenarios", name]
+    for option in SCENARIO_OPTIONS:
+        command += [f"--{option.replace('_', '-')}", str(getattr(args, option))]
+    if args.trace_memory:
+        command.append("--trace-memory")
+    with tempfile.TemporaryDirectory(prefix="chaotic-bench-") as directory:
+        result_path = os.path.join(directory, "result.json")
+        completed = subprocess.run(command + ["--result-file", result_path])
+        if completed.returncode != 0 or not os.path.exists(result_path):
+            raise RuntimeError(f"scenario {name!r} failed with exit code {completed.returncode}")
+        with open(result_path, encoding="utf-8") as f:
+            return json.load(f)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the planner offline against a fake chat model")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        help=f"comma-separated subset of {', '.join(SCENARIOS)}")
+    parser.add_argument("--iterations", type=int, default=8, help="runs per scenario")
+    parser.add_argument("--concurrency", type=int, default=4, help="concurrent runs where supported")
+    parser.add_argument("--ttft", type=float, default=0.3, help="median time to first token (seconds)")
+    parser.add_argument("--ttft-sigma", type=float, default=0.5, help="log-normal spread of time to first token")
+    parser.add_argument("--tokens-per-second", type=float, default=250.0)
+    parser.add_argument("--reply-tokens", type=int, default=300)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of calls failing with a 429")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="also report the tracemalloc peak (slows the run down)")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline results to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="relative change that counts as a regression")
+    parser.add_argument("--result-file", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    names = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    for name in names:
+        if name not in SCENARIOS:
+            parser.error(f"unknown scenario {name!r}")
+
+    if args.result_file:
+        # Child process: run the single requested scenario
+        profile = FakeLLMProfile(
+            ttft_seconds=args.ttft, ttft_sigma=args.ttft_sigma, tokens_per_second=args.tokens_per_second,
+            error_rate=args.error_rate, reply_tokens=args.reply_tokens, seed=args.seed,
+        )
+        set_llm_factory(lambda model, max_tokens: FakeChatModel(profile=profile, model_name=model))
+        result = measure(names[0], lambda: SCENARIOS[names[0]](args), args.trace_memory)
+        with open(args.result_file, "w", encoding="utf-8") as f:
+            json.dump(result, f)
+        return 0
+
+    print(f"🧪 Benchmarking against a fake model (ttft {args.ttft}s, {args.tokens_per_second} tok/s, "
+          f"{args.error_rate:.0%} errors)")
+    results = {name: run_isolated(name, args) for name in names}
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"💾 Baseline saved to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"ℹ️ No baseline at {args.baseline}; run with --save-baseline to create one")
+        return 0
+    with open(args.baseline, encoding="utf-8") as f:
+        regressions = compare(results, json.load(f), args.tolerance)
+    for regression in regressions:
+        print(f"⚠️ Regression: {regression}")
+    if not regressions:
+        print("✅ No regressions against the baseline")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
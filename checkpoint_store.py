@@ -0,0 +1,65 @@
+import os
+import sqlite3
+
+from langgraph.checkpoint.sqlite import SqliteSaver
+
+import config
+
+
+def open_checkpointer(path: str = config.CHECKPOINT_PATH) -> SqliteSaver:
+    """SQLite checkpointer that persists workflow state after every step"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(path, check_same_thread=False)
+    saver = SqliteSaver(conn)
+    saver.setup()
+    return saver
+
+
+def _stored_bytes(conn: sqlite3.Connection) -> int:
+    checkpoints = conn.execute(
+        "SELECT COALESCE(SUM(LENGTH(checkpoint) + LENGTH(metadata)), 0) FROM checkpoints"
+    ).fetchone()[0]
+    writes = conn.execute("SELECT COALESCE(SUM(LENGTH(value)), 0) FROM writes").fetchone()[0]
+    return checkpoints + writes
+
+
+def _delete_thread(conn: sqlite3.Connection, thread_id: str):
+    conn.execute("DELETE FROM checkpoints WHERE thread_id = ?", (thread_id,))
+    conn.execute("DELETE FROM writes WHERE thread_id = ?", (thread_id,))
+
+
+def prune_checkpoints(saver: SqliteSaver,
+                      max_threads: int = config.CHECKPOINT_MAX_THREADS,
+                      max_per_thread: int = config.CHECKPOINT_MAX_PER_THREAD,
+                      max_bytes: int = config.CHECKPOINT_MAX_BYTES):
+    """Apply the retention policy to the checkpoint store.
+
+    Keeps the newest ``max_per_thread`` checkpoints of each run (only the
+    latest is needed to resume) and the ``max_threads`` most recently active
+    runs, then drops the oldest runs until the stored data fits in
+    ``max_bytes``. Checkpoint ids are time-ordered, so newest means largest.
+    """
+    conn = saver.conn
+    with saver.lock, conn:
+        conn.execute(
+            "DELETE FROM checkpoints WHERE rowid IN ("
+            "SELECT rowid FROM (SELECT rowid, ROW_NUMBER() OVER ("
+            "PARTITION BY thread_id, checkpoint_ns ORDER BY checkpoint_id DESC) AS rank "
+            "FROM checkpoints) WHERE rank > ?)",
+            (max_per_thread,),
+        )
+        threads = [row[0] for row in conn.execute(
+            "SELECT thread_id FROM checkpoints GROUP BY thread_id ORDER BY MAX(checkpoint_id) DESC"
+        )]
+        for thread_id in threads[max_threads:]:
+            _delete_thread(conn, thread_id)
+        conn.execute(
+            "DELETE FROM writes WHERE NOT EXISTS (SELECT 1 FROM checkpoints c "
+            "WHERE c.thread_id = writes.thread_id AND c.checkpoint_ns = writes.checkpoint_ns "
+            "AND c.checkpoint_id = writes.checkpoint_id)"
+        )
+        kept = threads[:max_threads]
+        while len(kept) > 1 and _stored_bytes(conn) > max_bytes:
+            _delete_thread(conn, kept.pop())
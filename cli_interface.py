@@ -1,5 +1,12 @@
+import uuid
+import config
 from workflow_engine import create_workflow
+from checkpoint_store import open_checkpointer, prune_checkpoints
 from state_definitions import PlannerState
+from response_cache import get_response_cache
+from llm_provider import hedger
+from tracing import dump_trace
+from usage_ledger import ledger, usage_scope
 
 def get_initial_state() -> PlannerState:
     """Initialize the state for CLI workflow"""
@@ -22,24 +29,59 @@ def get_initial_state() -> PlannerState:
         "safety_info": "",
         "current_step": "",
         "user_satisfaction": None,
-        "refinement_requested": False
+        "refinement_requested": False,
+        "section_inputs": {}
     }
 
 def run_cli_planner():
-    """Run the full LangGraph workflow in CLI mode"""
-    app = create_workflow()
-    initial_state = get_initial_state()
+    """Run the full LangGraph workflow in CLI mode.
+
+    Every completed step is checkpointed, so an interrupted or failed run can
+    be resumed with its session id without paying for finished LLM calls again.
+    """
+    checkpointer = open_checkpointer()
+    app = create_workflow(checkpointer=checkpointer)
+    
+    print("🔖 Session id to resume (leave blank to start a new plan): ")
+    session_id = input("Your Input: ").strip()
+    run_config = {"configurable": {"thread_id": session_id}}
     
-    print("\n🌟 Starting your chaotic travel planning journey...")
-    print("Follow the prompts to create your ultimate travel itinerary!")
+    if session_id and app.get_state(run_config).next:
+        print(f"\n♻️ Resuming session {session_id} from where it stopped...")
+        run_input = None
+    else:
+        if session_id:
+            print(f"\nℹ️ Nothing to resume for {session_id}, starting a new plan.")
+        # A finished session's messages would carry into the new plan through the state reducers
+        run_config = {"configurable": {"thread_id": uuid.uuid4().hex[:8]}}
+        run_input = get_initial_state()
+        print(f"\n🌟 Starting your chaotic travel planning journey... (session id: {run_config['configurable']['thread_id']})")
+        print("Follow the prompts to create your ultimate travel itinerary!")
     print("-" * 60)
     
     try:
-        final_state = app.invoke(initial_state)
+        with usage_scope(run_config["configurable"]["thread_id"]):
+            final_state = app.invoke(run_input, run_config)
         print("\n🎉 Your adventure plan is complete!")
         print("Safe travels and enjoy your chaotic adventure! 🌍✨")
     except KeyboardInterrupt:
         print("\n\n🚫 Planning interrupted. Come back anytime for your chaotic adventure!")
+        print(f"Resume with session id: {run_config['configurable']['thread_id']}")
     except Exception as e:
         print(f"\n❌ An error occurred: {e}")
-        print("Please try again or use the web interface.")
\ No newline at end of file
+        print(f"Resume with session id {run_config['configurable']['thread_id']}, or use the web interface.")
+    finally:
+        prune_checkpoints(checkpointer)
+        stats = get_response_cache().stats()
+        print(f"\n🗄️ Response cache: {stats['hits']} hits, {stats['misses']} misses")
+        if config.HEDGE_REQUESTS:
+            hedges = hedger.stats()
+            print(f"🏁 Hedged requests: {hedges['fired']} of {hedges['requests']} fired, {hedges['won']} won, "
+                  f"{hedges['loser_tokens']} tokens spent on losers (~${hedges['loser_cost_usd']:.4f})")
+        usage = ledger.session_usage(run_config["configurable"]["thread_id"])
+        print(f"🔢 Tokens used: {usage['prompt_tokens']} prompt, {usage['completion_tokens']} completion "
+              f"(~${usage['cost_usd']:.4f})")
+        if config.TRACE_DUMP_PATH:
+            print(f"🧭 Trace written to {dump_trace()}")
+        if config.USAGE_EXPORT_PATH:
+            print(f"📒 Usage written to {ledger.export()}")
@@ -0,0 +1,165 @@
+import os
+
+
+def _env_int(name: str, default: int) -> int:
+    """Read an integer setting from the environment"""
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+def _env_list(name: str, default: list) -> list:
+    """Read a comma-separated list setting from the environment"""
+    value = os.getenv(name)
+    if not value:
+        return list(default)
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def _env_routes(name: str, default: dict) -> dict:
+    """Read "section=model[:max_tokens]" pairs (comma separated) from the environment"""
+    value = os.getenv(name)
+    if not value:
+        return dict(default)
+    routes = {}
+    for item in value.split(","):
+        section, _, target = item.strip().partition("=")
+        if not section or not target:
+            continue
+        model, _, max_tokens = target.rpartition(":")
+        if not model or not max_tokens.isdigit():
+            model, max_tokens = target, ""
+        routes[section.strip()] = (model.strip(), int(max_tokens) if max_tokens else None)
+    return routes
+
+
+def _env_prices(name: str, default: dict) -> dict:
+    """Read "model=input_price:output_price" pairs (comma separated) from the environment"""
+    value = os.getenv(name)
+    if not value:
+        return dict(default)
+    prices = {}
+    for item in value.split(","):
+        model, _, target = item.strip().partition("=")
+        input_price, _, output_price = target.partition(":")
+        if model and input_price and output_price:
+            prices[model.strip()] = (float(input_price), float(output_price))
+    return prices
+
+
+def _env_float(name: str, default: float) -> float:
+    """Read a float setting from the environment"""
+    value = os.getenv(name)
+    return float(value) if value else default
+
+
+# Section generation for the web interface
+SECTION_TIMEOUT_SECONDS = _env_float("SECTION_TIMEOUT_SECONDS", 60.0)
+
+# Alternative plan generation in the CLI workflow
+ALTERNATIVE_STYLES = _env_list("ALTERNATIVE_STYLES", ["budget-focused", "luxury", "off-the-beaten-path"])
+ALTERNATIVE_MAX_CONCURRENCY = _env_int("ALTERNATIVE_MAX_CONCURRENCY", 4)
+
+# Persistent LLM response cache
+RESPONSE_CACHE_PATH = os.getenv("RESPONSE_CACHE_PATH", os.path.join(".cache", "responses.sqlite3"))
+RESPONSE_CACHE_MAX_ENTRIES = _env_int("RESPONSE_CACHE_MAX_ENTRIES", 2000)
+RESPONSE_CACHE_TTL_SECONDS = _env_float("RESPONSE_CACHE_TTL_SECONDS", 7 * 24 * 3600.0)
+
+# Print workflow progress to the console (batch mode turns this off)
+CONSOLE_OUTPUT = os.getenv("CONSOLE_OUTPUT", "true").lower() in ("1", "true", "yes")
+
+# Stream the main itinerary token by token to the web and CLI outputs
+STREAM_ITINERARY = os.getenv("STREAM_ITINERARY", "true").lower() in ("1", "true", "yes")
+# Minimum time between streamed web updates; each one resends the whole itinerary
+STREAM_UPDATE_INTERVAL_SECONDS = _env_float("STREAM_UPDATE_INTERVAL_SECONDS", 0.08)
+
+# Lazily generated web sections: optionally warm them in the background
+PREFETCH_SECTIONS = os.getenv("PREFETCH_SECTIONS", "false").lower() in ("1", "true", "yes")
+PREFETCH_CONCURRENCY = _env_int("PREFETCH_CONCURRENCY", 2)
+
+# Per-session planning history in the web interface
+HISTORY_MAX_ENTRIES = _env_int("HISTORY_MAX_ENTRIES", 20)
+# Itineraries longer than this are stored once and shown as a preview; 0 disables compaction
+HISTORY_COMPACT_CHARS = _env_int("HISTORY_COMPACT_CHARS", 0)
+
+# Shared chat model client
+LLM_MODEL = os.getenv("LLM_MODEL", "llama-3.3-70b-versatile")
+LLM_MAX_CONNECTIONS = _env_int("LLM_MAX_CONNECTIONS", 32)
+LLM_MAX_KEEPALIVE_CONNECTIONS = _env_int("LLM_MAX_KEEPALIVE_CONNECTIONS", 16)
+LLM_KEEPALIVE_SECONDS = _env_float("LLM_KEEPALIVE_SECONDS", 60.0)
+LLM_REQUEST_TIMEOUT_SECONDS = _env_float("LLM_REQUEST_TIMEOUT_SECONDS", 30.0)
+# Alternative Groq-compatible API endpoint, e.g. the load test's stand-in server
+LLM_BASE_URL = os.getenv("LLM_BASE_URL", "")
+
+# Per-section model routing: the large model writes itineraries, a small fast
+# one handles the generic sections. Unlisted sections use LLM_MODEL.
+LLM_SMALL_MODEL = os.getenv("LLM_SMALL_MODEL", "llama-3.1-8b-instant")
+LLM_SECTION_MODELS = _env_routes("LLM_SECTION_MODELS", {
+    "itinerary": (LLM_MODEL, 4096),
+    "refine": (LLM_MODEL, 4096),
+    "recommendations": (LLM_MODEL, 1536),
+    "alternatives": (LLM_SMALL_MODEL, 1536),
+    "local_tips": (LLM_SMALL_MODEL, 1024),
+    "safety_info": (LLM_SMALL_MODEL, 1024),
+})
+LLM_DEFAULT_MAX_TOKENS = _env_int("LLM_DEFAULT_MAX_TOKENS", 2048)
+# Tried in order after a section's own model times out or is rate limited
+LLM_FALLBACK_MODELS = _env_list("LLM_FALLBACK_MODELS", [LLM_MODEL, LLM_SMALL_MODEL])
+
+# Hedged requests: duplicate a slow stream once its first token is overdue
+HEDGE_REQUESTS = os.getenv("HEDGE_REQUESTS", "false").lower() in ("1", "true", "yes")
+HEDGE_SECTIONS = _env_list("HEDGE_SECTIONS", ["itinerary"])
+HEDGE_PERCENTILE = _env_float("HEDGE_PERCENTILE", 0.95)
+# Used until HEDGE_MIN_SAMPLES first-token times have been observed
+HEDGE_DEFAULT_DELAY_SECONDS = _env_float("HEDGE_DEFAULT_DELAY_SECONDS", 3.0)
+HEDGE_MIN_SAMPLES = _env_int("HEDGE_MIN_SAMPLES", 20)
+# Largest share of eligible requests that may be duplicated
+HEDGE_MAX_RATIO = _env_float("HEDGE_MAX_RATIO", 0.1)
+
+# Rate limiting, admission and retries in front of Groq
+LLM_REQUESTS_PER_SECOND = _env_float("LLM_REQUESTS_PER_SECOND", 5.0)
+LLM_BURST = _env_float("LLM_BURST", 10.0)
+LLM_INITIAL_CONCURRENCY = _env_int("LLM_INITIAL_CONCURRENCY", 8)
+LLM_MIN_CONCURRENCY = _env_int("LLM_MIN_CONCURRENCY", 1)
+LLM_MAX_CONCURRENCY = _env_int("LLM_MAX_CONCURRENCY", 32)
+# Share of the concurrency limit that only the main itinerary and refinements may use
+LLM_HIGH_PRIORITY_RESERVE = _env_float("LLM_HIGH_PRIORITY_RESERVE", 0.25)
+LLM_MAX_RETRIES = _env_int("LLM_MAX_RETRIES", 4)
+LLM_RETRY_BASE_SECONDS = _env_float("LLM_RETRY_BASE_SECONDS", 0.5)
+LLM_RETRY_MAX_SECONDS = _env_float("LLM_RETRY_MAX_SECONDS", 20.0)
+
+# Gradio request queue
+GRADIO_CONCURRENCY_LIMIT = _env_int("GRADIO_CONCURRENCY_LIMIT", 256)
+GRADIO_QUEUE_MAX_SIZE = _env_int("GRADIO_QUEUE_MAX_SIZE", 1024)
+
+# Headless batch planning
+BATCH_WORKERS = _env_int("BATCH_WORKERS", 8)
+
+# Resumable CLI workflow runs
+CHECKPOINT_PATH = os.getenv("CHECKPOINT_PATH", os.path.join(".cache", "checkpoints.sqlite3"))
+CHECKPOINT_MAX_THREADS = _env_int("CHECKPOINT_MAX_THREADS", 100)
+CHECKPOINT_MAX_PER_THREAD = _env_int("CHECKPOINT_MAX_PER_THREAD", 5)
+CHECKPOINT_MAX_BYTES = _env_int("CHECKPOINT_MAX_BYTES", 50 * 1024 * 1024)
+
+# Approximate token budget for the CLI workflow's conversation history
+CONTEXT_TOKEN_BUDGET = _env_int("CONTEXT_TOKEN_BUDGET", 4000)
+
+# Tracing and metrics export
+TRACING = os.getenv("TRACING", "true").lower() in ("1", "true", "yes")
+TRACE_MAX_SPANS = _env_int("TRACE_MAX_SPANS", 5000)
+# Chrome trace JSON written when the CLI or a batch run exits; empty disables it
+TRACE_DUMP_PATH = os.getenv("TRACE_DUMP_PATH", "")
+# Port for the Prometheus /metrics and JSON /trace endpoint; 0 disables it
+METRICS_PORT = _env_int("METRICS_PORT", 0)
+# Interface the metrics endpoint listens on; loopback keeps it off the network
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+
+# Token usage accounting; prices are USD per million input/output tokens
+LLM_PRICES = _env_prices("LLM_PRICES", {
+    "llama-3.3-70b-versatile": (0.59, 0.79),
+    "llama-3.1-8b-instant": (0.05, 0.08),
+})
+# Tokens one CLI session, web session or batch trip may use; 0 means unlimited
+SESSION_TOKEN_BUDGET = _env_int("SESSION_TOKEN_BUDGET", 0)
+USAGE_MAX_SESSIONS = _env_int("USAGE_MAX_SESSIONS", 1000)
+# JSON usage aggregates written when the CLI or a batch run exits; empty disables it
+USAGE_EXPORT_PATH = os.getenv("USAGE_EXPORT_PATH", "")
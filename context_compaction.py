@@ -0,0 +1,64 @@
+from typing import List, Optional
+
+from langchain_core.messages import BaseMessage, SystemMessage
+
+# AIMessage.name marking a complete itinerary version
+ITINERARY_MESSAGE = "itinerary"
+# Characters kept from each older turn in the summary
+SUMMARY_LINE_CHARS = 80
+SUMMARY_HEADER = "Summary of earlier conversation:"
+
+
+class ReplaceMessages(list):
+    """Message update that replaces the whole history instead of appending to it"""
+
+
+def estimate_tokens(messages: List[BaseMessage]) -> int:
+    """Rough token count (about four characters per token plus per-message overhead)"""
+    return sum(len(str(message.content)) // 4 + 4 for message in messages)
+
+
+def _summarize(messages: List[BaseMessage]) -> SystemMessage:
+    lines = []
+    for message in messages:
+        if message.type == "system" and str(message.content).startswith(SUMMARY_HEADER):
+            # Carry an earlier summary's lines over rather than re-summarising it
+            lines.extend(str(message.content).splitlines()[1:])
+            continue
+        first_line = str(message.content).strip().splitlines()[0] if str(message.content).strip() else ""
+        if len(first_line) > SUMMARY_LINE_CHARS:
+            first_line = first_line[:SUMMARY_LINE_CHARS].rstrip() + "…"
+        lines.append(f"- {message.type}: {first_line}")
+    return SystemMessage(content=SUMMARY_HEADER + "\n" + "\n".join(lines))
+
+
+def compact_messages(messages: List[BaseMessage], token_budget: int) -> Optional[List[BaseMessage]]:
+    """Shrink a conversation to fit ``token_budget``, or return None if it already fits.
+
+    Superseded itinerary versions are dropped first, keeping only the latest.
+    If that is not enough, the oldest turns are folded into one short
+    extractive summary. The latest itinerary and the newest turns are kept
+    verbatim.
+    """
+    if estimate_tokens(messages) <= token_budget:
+        return None
+
+    latest_itinerary = max(
+        (i for i, message in enumerate(messages) if message.name == ITINERARY_MESSAGE),
+        default=None,
+    )
+    kept = [
+        message for i, message in enumerate(messages)
+        if message.name != ITINERARY_MESSAGE or i == latest_itinerary
+    ]
+
+    # Fold the oldest turns into a summary until the rest fits
+    folded = 0
+    while estimate_tokens(kept[folded:]) > token_budget and folded < len(kept) - 1:
+        if kept[folded].name == ITINERARY_MESSAGE:
+            break
+        folded += 1
+    if folded:
+        summary = _summarize(kept[:folded])
+        kept = [summary] + kept[folded:]
+    return kept
@@ -0,0 +1,141 @@
+import asyncio
+import random
+import threading
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, List, NamedTuple, Optional
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import ConfigDict
+
+WORDS = (
+    "explore the old town market then grab street food near the river and visit a hidden "
+    "museum before sunset walk through the park try a local cafe and book a night tour"
+).split()
+
+
+class FakeLLMError(Exception):
+    """Injected failure; looks like a Groq rate limit to the scheduler"""
+
+    def __init__(self, status_code: int = 429):
+        super().__init__(f"fake LLM error {status_code}")
+        self.status_code = status_code
+
+
+class FakeReply(NamedTuple):
+    ttft: float
+    tokens: List[str]
+    fails: bool
+
+
+class FakeLLMProfile:
+    """Deterministic latency, token rate, error rate and reply text for a stand-in LLM.
+
+    A reply depends only on the seed, the prompt and how many times that
+    prompt has been asked, so runs are repeatable however calls interleave.
+    Time to first token is log-normal around ``ttft_seconds``.
+    """
+
+    def __init__(self, ttft_seconds: float = 0.3, ttft_sigma: float = 0.5, tokens_per_second: float = 250.0,
+                 error_rate: float = 0.0, reply_tokens: int = 300, days: int = 3, seed: int = 0):
+        self.ttft_seconds = ttft_seconds
+        self.ttft_sigma = ttft_sigma
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.reply_tokens = reply_tokens
+        self.days = days
+        self.seed = seed
+        self._attempts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def plan(self, prompt: str) -> FakeReply:
+        """Latency, tokens and outcome for the next call with ``prompt``"""
+        with self._lock:
+            attempt = self._attempts.get(prompt, 0)
+            self._attempts[prompt] = attempt + 1
+        rng = random.Random(f"{self.seed}:{attempt}:{prompt}")
+        ttft = self.ttft_seconds * rng.lognormvariate(0.0, self.ttft_sigma) if self.ttft_sigma else self.ttft_seconds
+        if rng.random() < self.error_rate:
+            return FakeReply(ttft, [], True)
+
+        per_day = max(1, self.reply_tokens // self.days)
+        tokens = ["Here is your chaotic plan.\n"]
+        for day in range(1, self.days + 1):
+            tokens.append(f"\n## Day {day}\n")
+            tokens.extend(f"{rng.choice(WORDS)} " for _ in range(per_day))
+        return FakeReply(ttft, tokens, False)
+
+    def token_delay(self) -> float:
+        return 1.0 / self.tokens_per_second if self.tokens_per_second else 0.0
+
+
+def _prompt_text(messages: List[BaseMessage]) -> str:
+    return "\n".join(f"{message.type}: {message.content}" for message in messages)
+
+
+def _usage(prompt: str, tokens: List[str]) -> dict:
+    input_tokens = len(prompt) // 4
+    return {"input_tokens": input_tokens, "output_tokens": len(tokens),
+            "total_tokens": input_tokens + len(tokens)}
+
+
+class FakeChatModel(BaseChatModel):
+    """Local chat model that sleeps and answers according to a :class:`FakeLLMProfile`"""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    profile: FakeLLMProfile
+    model_name: str = "fake"
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def _reply(self, messages: List[BaseMessage]):
+        prompt = _prompt_text(messages)
+        return prompt, self.profile.plan(prompt)
+
+    def _result(self, prompt: str, reply: FakeReply) -> ChatResult:
+        message = AIMessage(content="".join(reply.tokens), usage_metadata=_usage(prompt, reply.tokens))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        prompt, reply = self._reply(messages)
+        time.sleep(reply.ttft)
+        if reply.fails:
+            raise FakeLLMError()
+        time.sleep(len(reply.tokens) * self.profile.token_delay())
+        return self._result(prompt, reply)
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        prompt, reply = self._reply(messages)
+        await asyncio.sleep(reply.ttft)
+        if reply.fails:
+            raise FakeLLMError()
+        await asyncio.sleep(len(reply.tokens) * self.profile.token_delay())
+        return self._result(prompt, reply)
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Any = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        prompt, reply = self._reply(messages)
+        time.sleep(reply.ttft)
+        if reply.fails:
+            raise FakeLLMError()
+        for token in reply.tokens:
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+            time.sleep(self.profile.token_delay())
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=_usage(prompt, reply.tokens)))
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Any = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        prompt, reply = self._reply(messages)
+        await asyncio.sleep(reply.ttft)
+        if reply.fails:
+            raise FakeLLMError()
+        for token in reply.tokens:
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+            await asyncio.sleep(self.profile.token_delay())
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=_usage(prompt, reply.tokens)))
@@ -0,0 +1,107 @@
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from fake_chat_model import FakeLLMProfile
+
+COMPLETIONS_PATH = "/openai/v1/chat/completions"
+
+
+def _prompt_text(messages: list) -> str:
+    return "\n".join(f"{message.get('role')}: {message.get('content')}" for message in messages)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: "FakeLLMServer"
+
+    def do_POST(self):
+        if self.path.rstrip("/") != COMPLETIONS_PATH:
+            self.send_error(404)
+            return
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        prompt = _prompt_text(body.get("messages", []))
+        profile = self.server.profile
+        reply = profile.plan(prompt)
+        time.sleep(reply.ttft)
+        if reply.fails:
+            self._send_json(429, {"error": {"message": "Rate limit reached", "type": "tokens",
+                                            "code": "rate_limit_exceeded"}},
+                            {"retry-after": "1"})
+            return
+
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        model = body.get("model", "fake")
+        usage = {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(reply.tokens),
+                 "total_tokens": len(prompt) // 4 + len(reply.tokens)}
+        if not body.get("stream"):
+            time.sleep(len(reply.tokens) * profile.token_delay())
+            self._send_json(200, {
+                "id": completion_id, "object": "chat.completion", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(reply.tokens)},
+                             "finish_reason": "stop"}],
+                "usage": usage,
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": model}
+        try:
+            for index, token in enumerate(reply.tokens):
+                delta = {"content": token, **({"role": "assistant"} if index == 0 else {})}
+                self._send_event({**chunk, "choices": [{"index": 0, "delta": delta, "finish_reason": None}]})
+                time.sleep(profile.token_delay())
+            # Groq reports streaming usage on the last chunk, under x_groq
+            self._send_event({**chunk, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+                              "x_groq": {"id": completion_id, "usage": usage}})
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # The client cancelled the stream, e.g. a hedged request that lost
+            pass
+
+    def _send_event(self, payload: dict):
+        self.wfile.write(f"data: {json.dumps(payload)}\n\n".encode("utf-8"))
+        self.wfile.flush()
+
+    def _send_json(self, status: int, payload: dict, headers: dict = None):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeLLMServer(ThreadingHTTPServer):
+    """Local stand-in for Groq's OpenAI-compatible chat completions API.
+
+    Point the app at it with ``LLM_BASE_URL=<server.url>``. Replies, latency
+    and errors follow ``profile``; streaming uses server-sent events.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, profile: FakeLLMProfile, host: str = "127.0.0.1", port: int = 0):
+        super().__init__((host, port), _Handler)
+        self.profile = profile
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeLLMServer":
+        """Serve from a background thread"""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
@@ -0,0 +1,251 @@
+import asyncio
+import contextvars
+import queue
+import threading
+import time
+from typing import AsyncIterator, Callable, Iterator, List, Optional, TypeVar
+
+import metrics
+
+T = TypeVar("T")
+
+_DONE = object()
+
+
+def _has_content(item) -> bool:
+    return bool(getattr(item, "content", item))
+
+
+async def _first_content(iterator: AsyncIterator[T], buffer: List[T]) -> bool:
+    """Buffer items up to the first one with content; True if the stream ended first"""
+    while True:
+        try:
+            item = await iterator.__anext__()
+        except StopAsyncIteration:
+            return True
+        buffer.append(item)
+        if _has_content(item):
+            return False
+
+
+class HedgeAttempt:
+    """One of a hedged request's calls, to which the caller reports billed usage.
+
+    Usage of an attempt that lost the race counts towards the hedging cost,
+    including usage reported after it was cancelled.
+    """
+
+    def __init__(self, hedger: "Hedger"):
+        self._hedger = hedger
+        self.tokens = 0
+        self.cost_usd = 0.0
+        self.lost = False
+
+    def used(self, tokens: int, cost_usd: float):
+        """Report tokens billed for this attempt and their estimated cost"""
+        with self._hedger._lock:
+            self.tokens += tokens
+            self.cost_usd += cost_usd
+            if self.lost:
+                self._hedger.loser_tokens += tokens
+                self._hedger.loser_cost_usd += cost_usd
+
+    def lose(self):
+        with self._hedger._lock:
+            if not self.lost:
+                self.lost = True
+                self._hedger.loser_tokens += self.tokens
+                self._hedger.loser_cost_usd += self.cost_usd
+
+
+class Hedger:
+    """Duplicate a slow request once it is late producing its first token.
+
+    The hedge fires when the first request has not produced content within
+    the ``percentile`` of recent times to first token. Whichever request
+    produces content first is streamed and the other is cancelled. At most
+    ``max_ratio`` of requests are ever hedged. ``start`` receives the
+    :class:`HedgeAttempt` it should report usage to.
+    """
+
+    def __init__(self, percentile: float, default_delay: float, min_samples: int, max_ratio: float):
+        self.percentile = percentile
+        self.default_delay = default_delay
+        self.min_samples = min_samples
+        self.max_ratio = max_ratio
+        self.requests = 0
+        self.fired = 0
+        self.won = 0
+        # Tokens and estimated cost of the requests that lost a hedge race
+        self.loser_tokens = 0
+        self.loser_cost_usd = 0.0
+        self._lock = threading.Lock()
+
+    def delay(self, section: str) -> float:
+        """How long to wait for a first token before hedging"""
+        observed = metrics.percentile(f"hedge.{section}.ttft", self.percentile, self.min_samples)
+        return self.default_delay if observed is None else observed
+
+    def _begin(self) -> float:
+        with self._lock:
+            self.requests += 1
+        return time.perf_counter()
+
+    def _may_fire(self) -> bool:
+        """Spend hedging budget on one duplicate request, if any is left"""
+        with self._lock:
+            if self.fired + 1 > self.max_ratio * self.requests:
+                return False
+            self.fired += 1
+            return True
+
+    def _chosen(self, section: str, started: float, winner: int):
+        metrics.observe(f"hedge.{section}.ttft", time.perf_counter() - started)
+        if winner == 1:
+            with self._lock:
+                self.won += 1
+
+    def stream(self, section: str, start: Callable[[HedgeAttempt], Iterator[T]]) -> Iterator[T]:
+        """Hedged version of ``start()``; each request streams on its own thread.
+
+        A cancelled request stops at its next chunk, since a blocking read
+        cannot be interrupted.
+        """
+        started = self._begin()
+        results: queue.Queue = queue.Queue()
+        cancelled = [threading.Event(), threading.Event()]
+        attempts = [HedgeAttempt(self), HedgeAttempt(self)]
+
+        def run(index: int):
+            try:
+                iterator = start(attempts[index])
+                try:
+                    for item in iterator:
+                        if cancelled[index].is_set():
+                            return
+                        results.put((index, item, None))
+                finally:
+                    close = getattr(iterator, "close", None)
+                    if close is not None:
+                        close()
+            except Exception as exc:
+                results.put((index, _DONE, exc))
+                return
+            results.put((index, _DONE, None))
+
+        # Worker threads run in a copy of the caller's context, so tracing spans nest
+        threading.Thread(target=contextvars.copy_context().run, args=(run, 0), daemon=True).start()
+        deadline = started + self.delay(section)
+        running, buffered = {0}, {0: [], 1: []}
+        hedged, winner = False, None
+        try:
+            while winner is None:
+                timeout = None if hedged else max(0.0, deadline - time.perf_counter())
+                try:
+                    index, item, exc = results.get(timeout=timeout)
+                except queue.Empty:
+                    hedged = True
+                    if self._may_fire():
+                        running.add(1)
+                        threading.Thread(
+                            target=contextvars.copy_context().run, args=(run, 1), daemon=True
+                        ).start()
+                    continue
+                if exc is not None:
+                    running.discard(index)
+                    if not running:
+                        raise exc
+                elif item is _DONE or _has_content(item):
+                    if item is not _DONE:
+                        buffered[index].append(item)
+                    winner = index
+                else:
+                    buffered[index].append(item)
+
+            for other in running - {winner}:
+                attempts[other].lose()
+                cancelled[other].set()
+            self._chosen(section, started, winner)
+            yield from buffered[winner]
+            if item is _DONE:
+                return
+            while True:
+                index, item, exc = results.get()
+                if index != winner:
+                    continue
+                if exc is not None:
+                    raise exc
+                if item is _DONE:
+                    return
+                yield item
+        finally:
+            for event in cancelled:
+                event.set()
+
+    async def astream(self, section: str, start: Callable[[HedgeAttempt], AsyncIterator[T]]) -> AsyncIterator[T]:
+        """Async counterpart of :meth:`stream`; the losing request is cancelled immediately"""
+        started = self._begin()
+        attempts = [HedgeAttempt(self), HedgeAttempt(self)]
+        iterators: List[AsyncIterator[T]] = [start(attempts[0])]
+        buffers: List[List[T]] = [[]]
+        tasks = {asyncio.ensure_future(_first_content(iterators[0], buffers[0])): 0}
+        deadline = started + self.delay(section)
+        hedged, winner, ended, error = False, None, False, None
+        try:
+            while winner is None:
+                timeout = None if hedged else max(0.0, deadline - time.perf_counter())
+                done, _ = await asyncio.wait(tasks, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedged = True
+                    if self._may_fire():
+                        iterators.append(start(attempts[1]))
+                        buffers.append([])
+                        tasks[asyncio.ensure_future(_first_content(iterators[1], buffers[1]))] = 1
+                    continue
+                for task in done:
+                    index = tasks.pop(task)
+                    if task.exception() is None:
+                        winner, ended = index, task.result()
+                        break
+                    error = task.exception()
+                if winner is None and not tasks:
+                    raise error
+        finally:
+            if winner is not None:
+                for index in range(len(iterators)):
+                    if index != winner:
+                        attempts[index].lose()
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            for index, iterator in enumerate(iterators):
+                if index != winner:
+                    await _aclose(iterator)
+
+        self._chosen(section, started, winner)
+        iterator = iterators[winner]
+        try:
+            for item in buffers[winner]:
+                yield item
+            if not ended:
+                async for item in iterator:
+                    yield item
+        finally:
+            await _aclose(iterator)
+
+    def stats(self) -> dict:
+        """How many requests were eligible, hedged and won by the hedge, and what the losers cost"""
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "fired": self.fired,
+                "won": self.won,
+                "loser_tokens": self.loser_tokens,
+                "loser_cost_usd": self.loser_cost_usd,
+            }
+
+
+async def _aclose(iterator: AsyncIterator):
+    aclose: Optional[Callable] = getattr(iterator, "aclose", None)
+    if aclose is not None:
+        await aclose()
@@ -0,0 +1,86 @@
+import re
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+# A line that starts a day: heading markup ("## Day 3", "**Day 3 - Museums**") or a
+# bare "Day 3" followed by ":", "-" or nothing. Prose such as "Day 3 is busy" is not one
+DAY_HEADING = re.compile(
+    r"^[ \t]*(?:(?:#{1,6}|\*\*|__)[#*_ \t]*day\s+(\d+)\b.*|day\s+(\d+)[ \t]*(?:[:\-–—].*)?)$",
+    re.IGNORECASE | re.MULTILINE,
+)
+# Day references in a refinement request, e.g. "day 3", "days 2 and 4", "day 2-3"
+DAY_REFERENCE = re.compile(r"\bdays?\s+(\d+(?:\s*(?:-|–|to|,|and|&)\s*\d+)*)", re.IGNORECASE)
+
+# Longest heading kept when a day is summarised as context for another day
+SUMMARY_CHARS = 120
+
+
+@dataclass
+class DayPlan:
+    """One day of an itinerary, including its heading line"""
+    number: int
+    text: str
+
+    @property
+    def heading(self) -> str:
+        return self.text.strip().splitlines()[0].strip()
+
+    def summary(self) -> str:
+        """One-line summary used as compact context for other days"""
+        heading = self.heading.strip("#* ")
+        return heading if len(heading) <= SUMMARY_CHARS else heading[:SUMMARY_CHARS].rstrip() + "…"
+
+
+@dataclass
+class ItineraryDocument:
+    """An itinerary split into an introduction and per-day sections"""
+    preamble: str
+    days: List[DayPlan] = field(default_factory=list)
+
+    def day(self, number: int) -> Optional[DayPlan]:
+        return next((day for day in self.days if day.number == number), None)
+
+    def context_for(self, number: int) -> str:
+        """Compact outline of every day except ``number``"""
+        return "\n".join(f"- {day.summary()}" for day in self.days if day.number != number)
+
+    def replace_day(self, number: int, text: str):
+        """Splice a regenerated day back in, keeping the blank-line layout"""
+        day = self.day(number)
+        trailing = day.text[len(day.text.rstrip()):]
+        day.text = text.strip() + (trailing or "\n\n")
+
+    def render(self) -> str:
+        return self.preamble + "".join(day.text for day in self.days)
+
+
+def parse_itinerary(text: str) -> ItineraryDocument:
+    """Split itinerary text at its "Day N" headings.
+
+    ``render()`` of the result reproduces ``text`` exactly. Text that follows
+    the last day heading stays with the last day, and consecutive headings
+    for the same day (e.g. "Day 2 morning", "Day 2 evening") form one day.
+    """
+    matches = list(DAY_HEADING.finditer(text))
+    if not matches:
+        return ItineraryDocument(preamble=text)
+    document = ItineraryDocument(preamble=text[:matches[0].start()])
+    for current, following in zip(matches, matches[1:] + [None]):
+        end = following.start() if following else len(text)
+        number = int(current.group(1) or current.group(2))
+        if document.days and document.days[-1].number == number:
+            document.days[-1].text += text[current.start():end]
+        else:
+            document.days.append(DayPlan(number=number, text=text[current.start():end]))
+    return document
+
+
+def requested_days(request: str) -> List[int]:
+    """Day numbers referenced by a refinement request"""
+    days = set()
+    for match in DAY_REFERENCE.finditer(request):
+        spec = match.group(1)
+        for start, end in re.findall(r"(\d+)\s*(?:-|–|to)\s*(\d+)", spec):
+            days.update(range(int(start), int(end) + 1))
+        days.update(int(n) for n in re.findall(r"\d+", spec))
+    return sorted(days)
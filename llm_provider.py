@@ -0,0 +1,339 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+from typing import AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
+
+import httpx
+from langchain_core.language_models import BaseChatModel, LanguageModelInput
+from langchain_core.messages import AIMessageChunk, BaseMessage, BaseMessageChunk, HumanMessage
+from langchain_groq import ChatGroq
+
+import config
+from context_compaction import estimate_tokens
+from hedging import HedgeAttempt, Hedger
+from tracing import atrace_stream, span, trace_stream
+from usage_ledger import cost_of, ledger
+from llm_scheduler import PRIORITY_HIGH, PRIORITY_LOW, get_scheduler
+from model_router import Route, route_for, should_fall_back
+from response_cache import skip_store
+from single_flight import SingleFlight
+
+T = TypeVar("T")
+
+# Sections that get reserved capacity under load; everything else is secondary
+HIGH_PRIORITY_SECTIONS = {"itinerary", "refine"}
+
+_models: Dict[Tuple[str, Optional[int]], BaseChatModel] = {}
+# Builds models instead of ChatGroq when set, e.g. by the benchmarks
+_factory: Optional[Callable[[str, Optional[int]], BaseChatModel]] = None
+_clients: Optional[Tuple[httpx.Client, httpx.AsyncClient]] = None
+_lock = threading.Lock()
+
+# Identical in-flight requests share one Groq call
+flights = SingleFlight()
+
+# Duplicates slow first tokens for the sections in HEDGE_SECTIONS
+hedger = Hedger(
+    percentile=config.HEDGE_PERCENTILE,
+    default_delay=config.HEDGE_DEFAULT_DELAY_SECONDS,
+    min_samples=config.HEDGE_MIN_SAMPLES,
+    max_ratio=config.HEDGE_MAX_RATIO,
+)
+
+# Requests answered by a fallback model after their primary timed out or was throttled
+fallbacks = 0
+_fallbacks_lock = threading.Lock()
+
+
+def _http_limits() -> httpx.Limits:
+    """Connection pool limits shared by every LLM call in the process"""
+    return httpx.Limits(
+        max_connections=config.LLM_MAX_CONNECTIONS,
+        max_keepalive_connections=config.LLM_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=config.LLM_KEEPALIVE_SECONDS,
+    )
+
+
+def set_llm_factory(factory: Optional[Callable[[str, Optional[int]], BaseChatModel]]):
+    """Build chat models with ``factory(model, max_tokens)`` instead of ChatGroq.
+
+    Lets the app run against a local stand-in model; None restores ChatGroq.
+    """
+    global _factory
+    with _lock:
+        _factory = factory
+        _models.clear()
+
+
+def get_llm(model: Optional[str] = None, max_tokens: Optional[int] = None) -> BaseChatModel:
+    """Return the shared chat model for ``model`` and ``max_tokens``, creating it on first use.
+
+    Every model shares one pooled keep-alive HTTP transport and its
+    connection limits, whichever section it serves.
+    """
+    global _clients
+    key = (model or config.LLM_MODEL, max_tokens)
+    llm = _models.get(key)
+    if llm is None:
+        with _lock:
+            llm = _models.get(key)
+            if llm is None:
+                if _factory is not None:
+                    llm = _models[key] = _factory(*key)
+                else:
+                    if _clients is None:
+                        limits = _http_limits()
+                        _clients = (httpx.Client(limits=limits), httpx.AsyncClient(limits=limits))
+                    llm = _models[key] = ChatGroq(
+                        temperature=0.1,
+                        groq_api_key=os.getenv("GROQ_API_KEY"),
+                        model_name=key[0],
+                        max_tokens=max_tokens,
+                        base_url=config.LLM_BASE_URL or None,
+                        timeout=config.LLM_REQUEST_TIMEOUT_SECONDS,
+                        # Retries are handled by the scheduler
+                        max_retries=0,
+                        http_client=_clients[0],
+                        http_async_client=_clients[1],
+                    )
+    return llm
+
+
+def _fell_back(route: Route, index: int, exc: Exception) -> bool:
+    """Whether a failure on ``route.models[index]`` should move on to the next model.
+
+    The fallback happens inside the scheduler's admission slot, so a rate
+    limit on the primary is reported to the scheduler here; otherwise the
+    limiter would only see the fallback's success and never back off.
+    """
+    global fallbacks
+    if index + 1 >= len(route.models) or not should_fall_back(exc):
+        return False
+    get_scheduler().record_throttle(exc)
+    with _fallbacks_lock:
+        fallbacks += 1
+    return True
+
+
+def from_fallback(message: BaseMessage) -> bool:
+    """Whether ``message``, or a stream chunk, came from a fallback model.
+
+    Cache keys name the section's primary model, so such answers must not be cached.
+    """
+    return "fallback_model" in message.response_metadata
+
+
+def _mark_fallback(message: BaseMessage, index: int, model: str):
+    if index:
+        message.response_metadata["fallback_model"] = model
+
+
+def _call_routed(route: Route, section: str, call: Callable[[BaseChatModel], BaseMessage]) -> BaseMessage:
+    for index, model in enumerate(route.models):
+        try:
+            response = call(get_llm(model, route.max_tokens))
+        except Exception as exc:
+            if not _fell_back(route, index, exc):
+                raise
+            continue
+        ledger.record(section, model, getattr(response, "usage_metadata", None))
+        _mark_fallback(response, index, model)
+        return response
+
+
+async def _acall_routed(route: Route, section: str,
+                        call: Callable[[BaseChatModel], Awaitable[BaseMessage]]) -> BaseMessage:
+    for index, model in enumerate(route.models):
+        try:
+            response = await call(get_llm(model, route.max_tokens))
+        except Exception as exc:
+            if not _fell_back(route, index, exc):
+                raise
+            continue
+        ledger.record(section, model, getattr(response, "usage_metadata", None))
+        _mark_fallback(response, index, model)
+        return response
+
+
+def _prompt_messages(messages: LanguageModelInput) -> List[BaseMessage]:
+    if hasattr(messages, "to_messages"):
+        return messages.to_messages()
+    if isinstance(messages, str):
+        return [HumanMessage(content=messages)]
+    return list(messages)
+
+
+def _record_usage(section: str, model: str, usage: dict, attempt: Optional[HedgeAttempt]):
+    ledger.record(section, model, usage)
+    if attempt is not None:
+        prompt_tokens, completion_tokens = int(usage.get("input_tokens", 0)), int(usage.get("output_tokens", 0))
+        attempt.used(prompt_tokens + completion_tokens, cost_of(model, prompt_tokens, completion_tokens))
+
+
+def _abandoned_usage(messages: LanguageModelInput, chunks: int) -> dict:
+    """Estimated usage of a stream closed before its usage chunk arrived; Groq still bills it"""
+    prompt_tokens = estimate_tokens(_prompt_messages(messages))
+    return {"input_tokens": prompt_tokens, "output_tokens": chunks, "total_tokens": prompt_tokens + chunks}
+
+
+def _stream_routed(route: Route, section: str, messages: LanguageModelInput,
+                   attempt: Optional[HedgeAttempt] = None) -> Iterator[BaseMessageChunk]:
+    """Stream from the first model that answers; no fallback once output has started.
+
+    Usage is recorded from the chunks that carry it (normally the last one).
+    A stream closed before then, such as a cancelled hedge, is recorded
+    with an estimate instead. A fallback model's first chunk is marked for
+    :func:`from_fallback`.
+    """
+    for index, model in enumerate(route.models):
+        chunks, recorded = 0, False
+        try:
+            for chunk in get_llm(model, route.max_tokens).stream(messages):
+                if not chunks:
+                    _mark_fallback(chunk, index, model)
+                chunks += 1
+                usage = getattr(chunk, "usage_metadata", None)
+                if usage:
+                    recorded = True
+                    _record_usage(section, model, usage, attempt)
+                yield chunk
+            return
+        except GeneratorExit:
+            if not recorded:
+                _record_usage(section, model, _abandoned_usage(messages, chunks), attempt)
+            raise
+        except Exception as exc:
+            if chunks or not _fell_back(route, index, exc):
+                raise
+
+
+async def _astream_routed(route: Route, section: str, messages: LanguageModelInput,
+                          attempt: Optional[HedgeAttempt] = None) -> AsyncIterator[BaseMessageChunk]:
+    for index, model in enumerate(route.models):
+        chunks, recorded = 0, False
+        try:
+            async for chunk in get_llm(model, route.max_tokens).astream(messages):
+                if not chunks:
+                    _mark_fallback(chunk, index, model)
+                chunks += 1
+                usage = getattr(chunk, "usage_metadata", None)
+                if usage:
+                    recorded = True
+                    _record_usage(section, model, usage, attempt)
+                yield chunk
+            return
+        except (GeneratorExit, asyncio.CancelledError):
+            if not recorded:
+                _record_usage(section, model, _abandoned_usage(messages, chunks), attempt)
+            raise
+        except Exception as exc:
+            if chunks or not _fell_back(route, index, exc):
+                raise
+
+
+def _hedged(section: str) -> bool:
+    return config.HEDGE_REQUESTS and section in config.HEDGE_SECTIONS
+
+
+def _collect(chunks: Iterator[BaseMessageChunk]) -> BaseMessage:
+    message = None
+    for chunk in chunks:
+        message = chunk if message is None else message + chunk
+    return message if message is not None else AIMessageChunk(content="")
+
+
+async def _acollect(chunks: AsyncIterator[BaseMessageChunk]) -> BaseMessage:
+    message = None
+    async for chunk in chunks:
+        message = chunk if message is None else message + chunk
+    return message if message is not None else AIMessageChunk(content="")
+
+
+def _priority(section: str) -> int:
+    return PRIORITY_HIGH if section in HIGH_PRIORITY_SECTIONS else PRIORITY_LOW
+
+
+def _request_key(messages: LanguageModelInput, route: Route) -> str:
+    """Identity of a request: its model route plus the fully formatted prompt messages"""
+    payload = json.dumps(
+        [list(route.models), route.max_tokens]
+        + [[message.type, message.content] for message in _prompt_messages(messages)],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def invoke_llm(messages: LanguageModelInput, section: str) -> BaseMessage:
+    """Invoke the section's model through the rate limiter and retry scheduler.
+
+    Hedged sections are streamed and collected, so a slow first token can
+    be hedged.
+    """
+    ledger.check_budget()
+    route = route_for(section)
+    if _hedged(section):
+        call = lambda: _collect(_stream_scheduled(messages, section, route))
+    else:
+        call = lambda: get_scheduler().run(
+            lambda: _call_routed(route, section, lambda llm: llm.invoke(messages)), _priority(section)
+        )
+    with span(f"llm.{section}", model=route.models[0]):
+        response = flights.do(_request_key(messages, route), call)
+    # Checked on the result, so callers sharing a coalesced call are covered too
+    if from_fallback(response):
+        skip_store("fallback")
+    return response
+
+
+def stream_llm(messages: LanguageModelInput, section: str) -> Iterator[BaseMessageChunk]:
+    """Stream from the section's model through the rate limiter and retry scheduler"""
+    ledger.check_budget()
+    route = route_for(section)
+    return trace_stream(f"llm.{section}", _stream_scheduled(messages, section, route), model=route.models[0])
+
+
+def _stream_scheduled(messages: LanguageModelInput, section: str, route: Route) -> Iterator[BaseMessageChunk]:
+    """Stream through the scheduler, hedged for the sections in HEDGE_SECTIONS"""
+    start = lambda attempt=None: get_scheduler().stream(
+        lambda: _stream_routed(route, section, messages, attempt), _priority(section)
+    )
+    return hedger.stream(section, start) if _hedged(section) else start()
+
+
+async def ainvoke_llm(messages: LanguageModelInput, section: str) -> BaseMessage:
+    """Async counterpart of :func:`invoke_llm`"""
+    ledger.check_budget()
+    route = route_for(section)
+    if _hedged(section):
+        call = lambda: _acollect(_astream_scheduled(messages, section, route))
+    else:
+        call = lambda: get_scheduler().arun(
+            lambda: _acall_routed(route, section, lambda llm: llm.ainvoke(messages)), _priority(section)
+        )
+    with span(f"llm.{section}", model=route.models[0]):
+        response = await flights.ado(_request_key(messages, route), call)
+    if from_fallback(response):
+        skip_store("fallback")
+    return response
+
+
+def _astream_scheduled(messages: LanguageModelInput, section: str,
+                       route: Route) -> AsyncIterator[BaseMessageChunk]:
+    """Async counterpart of :func:`_stream_scheduled`"""
+    start = lambda attempt=None: get_scheduler().astream(
+        lambda: _astream_routed(route, section, messages, attempt), _priority(section)
+    )
+    return hedger.astream(section, start) if _hedged(section) else start()
+
+
+def astream_llm(messages: LanguageModelInput, section: str) -> AsyncIterator[BaseMessageChunk]:
+    """Async counterpart of :func:`stream_llm`; identical concurrent streams share one call"""
+    ledger.check_budget()
+    route = route_for(section)
+    return atrace_stream(
+        f"llm.{section}",
+        flights.astream(_request_key(messages, route), lambda: _astream_scheduled(messages, section, route)),
+        model=route.models[0],
+    )
@@ -0,0 +1,357 @@
+import asyncio
+import heapq
+import itertools
+import random
+import threading
+import time
+from typing import AsyncIterator, Awaitable, Callable, Iterator, List, Optional, Tuple, TypeVar
+
+import config
+import tracing
+
+T = TypeVar("T")
+
+# Lower values are served first when capacity is tight
+PRIORITY_HIGH = 0  # main itinerary and refinement
+PRIORITY_LOW = 1   # secondary sections
+
+_RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+_RETRYABLE_ERRORS = {
+    "APIConnectionError", "APITimeoutError", "RateLimitError", "InternalServerError",
+    "ConnectError", "ConnectTimeout", "ReadTimeout", "ReadError", "RemoteProtocolError",
+}
+
+
+class TokenBucket:
+    """Request-rate bucket refilled continuously at ``rate`` requests per second.
+
+    Not thread-safe on its own; :class:`AdaptiveLimiter` calls it under its lock.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+
+    def take(self) -> float:
+        """Take one token if one is available and return 0, else return how long until one is"""
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0.0
+        return (1 - self._tokens) / self.rate
+
+
+class _Waiter:
+    """A queued admission request; ``wake`` is called once it has been granted"""
+
+    __slots__ = ("priority", "order", "wake", "granted", "cancelled")
+
+    def __init__(self, priority: int, order: int, wake: Callable[[], None]):
+        self.priority = priority
+        self.order = order
+        self.wake = wake
+        self.granted = False
+        self.cancelled = False
+
+    def __lt__(self, other: "_Waiter") -> bool:
+        return (self.priority, self.order) < (other.priority, other.order)
+
+
+def _resolve(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+class AdaptiveLimiter:
+    """Concurrency limit that adapts to throttling (additive increase, multiplicative decrease).
+
+    Callers are admitted strictly in priority order, then first come first
+    served: each one gets a rate token from ``bucket`` and a concurrency slot
+    together, so a main-itinerary call never waits behind queued secondary
+    calls for either. A share of the limit is reserved for high-priority
+    calls so secondary sections can never starve the main itinerary.
+    """
+
+    def __init__(self, initial: int, minimum: int, maximum: int, reserved_fraction: float,
+                 bucket: Optional[TokenBucket] = None):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.reserved_fraction = reserved_fraction
+        self.bucket = bucket
+        self.in_flight = 0
+        self._waiters: List[_Waiter] = []
+        self._order = itertools.count()
+        self._timer: Optional[threading.Timer] = None
+        self._lock = threading.Lock()
+
+    def _capacity(self, priority: int) -> int:
+        limit = max(1, int(self.limit))
+        if priority == PRIORITY_HIGH:
+            return limit
+        return max(1, limit - max(1, int(limit * self.reserved_fraction)))
+
+    def _dispatch(self):
+        """Grant queued waiters in priority order while slots and rate tokens last (lock held)"""
+        while self._waiters:
+            waiter = self._waiters[0]
+            if waiter.cancelled:
+                heapq.heappop(self._waiters)
+                continue
+            if self.in_flight >= self._capacity(waiter.priority):
+                return
+            wait = self.bucket.take() if self.bucket is not None else 0.0
+            if wait:
+                self._wake_after(wait)
+                return
+            heapq.heappop(self._waiters)
+            self.in_flight += 1
+            waiter.granted = True
+            try:
+                waiter.wake()
+            except RuntimeError:
+                # The waiter's event loop has closed; nobody will use the slot
+                self.in_flight -= 1
+
+    def _wake_after(self, delay: float):
+        if self._timer is None:
+            self._timer = threading.Timer(delay, self._on_timer)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _on_timer(self):
+        with self._lock:
+            self._timer = None
+            self._dispatch()
+
+    def _enqueue(self, priority: int, wake: Callable[[], None]) -> _Waiter:
+        with self._lock:
+            waiter = _Waiter(priority, next(self._order), wake)
+            heapq.heappush(self._waiters, waiter)
+            self._dispatch()
+            return waiter
+
+    def acquire(self, priority: int):
+        """Block until this caller's turn comes and a slot and rate token are free"""
+        granted = threading.Event()
+        waiter = self._enqueue(priority, granted.set)
+        if not waiter.granted:
+            granted.wait()
+
+    async def aacquire(self, priority: int):
+        """Async counterpart of :meth:`acquire`; waiting never blocks the event loop"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        waiter = self._enqueue(priority, lambda: loop.call_soon_threadsafe(_resolve, future))
+        if waiter.granted:
+            return
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter.granted:
+                    self.in_flight -= 1
+                    self._dispatch()
+                else:
+                    waiter.cancelled = True
+            raise
+
+    def throttle(self):
+        """Halve the limit after a rate-limit response that did not end the call"""
+        with self._lock:
+            self.limit = max(self.minimum, self.limit * 0.5)
+
+    def release(self, outcome: str):
+        """Return a slot; ``outcome`` is "ok", "throttled" or "error" """
+        with self._lock:
+            self.in_flight -= 1
+            if outcome == "throttled":
+                self.limit = max(self.minimum, self.limit * 0.5)
+            elif outcome == "ok":
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            self._dispatch()
+
+
+def classify_error(exc: Exception) -> Tuple[bool, bool]:
+    """Return ``(retryable, throttled)`` for an exception raised by the LLM client"""
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    throttled = status == 429 or type(exc).__name__ == "RateLimitError"
+    retryable = throttled or status in _RETRYABLE_STATUS or type(exc).__name__ in _RETRYABLE_ERRORS
+    return retryable, throttled
+
+
+def _retry_after(exc: Exception) -> Optional[float]:
+    """Delay requested by the server's Retry-After header, if any"""
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class LLMScheduler:
+    """Rate limiting, prioritised admission and jittered retries for LLM calls"""
+
+    def __init__(self, rate: float, burst: float, initial_concurrency: int, min_concurrency: int,
+                 max_concurrency: int, reserved_fraction: float, max_retries: int,
+                 base_delay: float, max_delay: float):
+        self.bucket = TokenBucket(rate, burst)
+        self.limiter = AdaptiveLimiter(
+            initial_concurrency, min_concurrency, max_concurrency, reserved_fraction, bucket=self.bucket
+        )
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retries = 0
+        self.throttled = 0
+
+    def backoff(self, attempt: int, exc: Exception) -> float:
+        """Full-jitter exponential backoff, never shorter than Retry-After"""
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        return max(delay, _retry_after(exc) or 0.0)
+
+    def _admit(self, priority: int):
+        self.limiter.acquire(priority)
+
+    async def _aadmit(self, priority: int):
+        await self.limiter.aacquire(priority)
+
+    def _failed(self, exc: Exception, attempt: int, partial: bool = False) -> Tuple[str, Optional[float]]:
+        """Outcome for the limiter and the delay before retrying, or None to give up"""
+        retryable, throttled = classify_error(exc)
+        if throttled:
+            self.throttled += 1
+        outcome = "throttled" if throttled else "error"
+        if partial or not retryable or attempt >= self.max_retries:
+            return outcome, None
+        self.retries += 1
+        tracing.annotate(retries=1)
+        return outcome, self.backoff(attempt, exc)
+
+    def record_throttle(self, exc: Exception):
+        """Back off for a rate limit handled inside a call, e.g. by switching to a fallback model"""
+        if classify_error(exc)[1]:
+            self.throttled += 1
+            self.limiter.throttle()
+
+    def run(self, call: Callable[[], T], priority: int = PRIORITY_LOW) -> T:
+        """Run ``call`` once admitted, retrying transient failures"""
+        attempt = 0
+        while True:
+            self._admit(priority)
+            outcome, delay = "error", None
+            try:
+                result = call()
+                outcome = "ok"
+                return result
+            except Exception as exc:
+                outcome, delay = self._failed(exc, attempt)
+                if delay is None:
+                    raise
+            finally:
+                self.limiter.release(outcome)
+            time.sleep(delay)
+            attempt += 1
+
+    async def arun(self, call: Callable[[], Awaitable[T]], priority: int = PRIORITY_LOW) -> T:
+        """Async counterpart of :meth:`run`; waiting never blocks the event loop"""
+        attempt = 0
+        while True:
+            await self._aadmit(priority)
+            outcome, delay = "error", None
+            try:
+                result = await call()
+                outcome = "ok"
+                return result
+            except Exception as exc:
+                outcome, delay = self._failed(exc, attempt)
+                if delay is None:
+                    raise
+            finally:
+                self.limiter.release(outcome)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def stream(self, start: Callable[[], Iterator[T]], priority: int = PRIORITY_LOW) -> Iterator[T]:
+        """Stream from ``start()`` while holding a slot.
+
+        Failures are retried only before the first chunk has been yielded.
+        """
+        attempt = 0
+        while True:
+            self._admit(priority)
+            outcome, delay, yielded = "error", None, False
+            try:
+                for item in start():
+                    yielded = True
+                    yield item
+                outcome = "ok"
+                return
+            except Exception as exc:
+                outcome, delay = self._failed(exc, attempt, partial=yielded)
+                if delay is None:
+                    raise
+            finally:
+                self.limiter.release(outcome)
+            time.sleep(delay)
+            attempt += 1
+
+    async def astream(self, start: Callable[[], AsyncIterator[T]],
+                      priority: int = PRIORITY_LOW) -> AsyncIterator[T]:
+        """Async counterpart of :meth:`stream`"""
+        attempt = 0
+        while True:
+            await self._aadmit(priority)
+            outcome, delay, yielded = "error", None, False
+            try:
+                async for item in start():
+                    yielded = True
+                    yield item
+                outcome = "ok"
+                return
+            except Exception as exc:
+                outcome, delay = self._failed(exc, attempt, partial=yielded)
+                if delay is None:
+                    raise
+            finally:
+                self.limiter.release(outcome)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def stats(self) -> dict:
+        """Current limit and retry counters"""
+        return {
+            "concurrency_limit": self.limiter.limit,
+            "in_flight": self.limiter.in_flight,
+            "retries": self.retries,
+            "throttled": self.throttled,
+        }
+
+
+_scheduler: Optional[LLMScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> LLMScheduler:
+    """Return the process-wide scheduler shared by every LLM call"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = LLMScheduler(
+                rate=config.LLM_REQUESTS_PER_SECOND,
+                burst=config.LLM_BURST,
+                initial_concurrency=config.LLM_INITIAL_CONCURRENCY,
+                min_concurrency=config.LLM_MIN_CONCURRENCY,
+                max_concurrency=config.LLM_MAX_CONCURRENCY,
+                reserved_fraction=config.LLM_HIGH_PRIORITY_RESERVE,
+                max_retries=config.LLM_MAX_RETRIES,
+                base_delay=config.LLM_RETRY_BASE_SECONDS,
+                max_delay=config.LLM_RETRY_MAX_SECONDS,
+            )
+        return _scheduler
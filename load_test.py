@@ -0,0 +1,262 @@
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from fake_chat_model import FakeLLMProfile
+from fake_llm_server import FakeLLMServer
+
+CITIES = ["Tokyo", "Paris", "Lisbon", "Mexico City", "Seoul", "Marrakech", "Istanbul", "Hanoi"]
+INTERESTS = ["food, museums", "nightlife, music", "hiking, nature", "architecture, history"]
+
+# Job states before the queue hands a request to a worker
+_QUEUED_STATES = {"STARTING", "JOINING_QUEUE", "IN_QUEUE"}
+STATUS_POLL_SECONDS = 0.005
+
+# Reference to a compacted itinerary in the session history markdown
+STORED_ID = re.compile(r"stored as `([0-9a-f]+)`")
+
+
+def serve_app(port: int):
+    """Child process: serve the production Blocks app (configured through the environment)"""
+    from dotenv import load_dotenv
+    from travel_planner import TravelPlanner
+
+    load_dotenv()
+    demo = TravelPlanner().create_gradio_interface()
+    demo.launch(server_name="127.0.0.1", server_port=port, share=False)
+
+
+def _rss_mb(pid: int) -> Optional[float]:
+    """Resident set size of ``pid`` from /proc (Linux only)"""
+    try:
+        with open(f"/proc/{pid}/status", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+    return None
+
+
+class RSSSampler:
+    """Track the peak RSS of a process from a background thread"""
+
+    def __init__(self, pid: int, interval: float = 0.25):
+        self.pid = pid
+        self.interval = interval
+        self.peak: Optional[float] = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            rss = _rss_mb(self.pid)
+            if rss is not None:
+                self.peak = max(self.peak or 0.0, rss)
+            self._stop.wait(self.interval)
+
+    def __enter__(self) -> "RSSSampler":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def _percentiles(samples: List[float]) -> Dict[str, float]:
+    ordered = sorted(samples)
+    if not ordered:
+        return {}
+    pick = lambda fraction: ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+    return {"p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99), "max": ordered[-1]}
+
+
+class Recorder:
+    """Thread-safe latency and queue-wait samples per endpoint"""
+
+    def __init__(self):
+        self.latency: Dict[str, List[float]] = {}
+        self.queue_wait: List[float] = []
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def add(self, endpoint: str, latency: float, queue_wait: Optional[float]):
+        with self._lock:
+            self.latency.setdefault(endpoint, []).append(latency)
+            if queue_wait is not None:
+                self.queue_wait.append(queue_wait)
+
+    def error(self):
+        with self._lock:
+            self.errors += 1
+
+
+def _call(client, recorder: Recorder, endpoint: str, *args):
+    """Submit one event and record its queue wait and end-to-end latency"""
+    started = time.perf_counter()
+    job = client.submit(*args, api_name=endpoint)
+    queue_wait = None
+    while not job.done():
+        if job.status().code.name not in _QUEUED_STATES:
+            queue_wait = time.perf_counter() - started
+            break
+        time.sleep(STATUS_POLL_SECONDS)
+    result = job.result()
+    if queue_wait is None:
+        queue_wait = time.perf_counter() - started
+    recorder.add(endpoint, time.perf_counter() - started, queue_wait)
+    return result
+
+
+def _stored_id(outputs) -> Optional[str]:
+    """Id of the newest compacted itinerary in a /plan result's session history"""
+    for value in outputs if isinstance(outputs, (list, tuple)) else [outputs]:
+        match = STORED_ID.search(value) if isinstance(value, str) else None
+        if match:
+            return match.group(1)
+    return None
+
+
+def run_session(url: str, user: int, flows: int, recorder: Recorder, open_sections: bool):
+    """One simulated user: plan trips, ask for a follow-up and reopen an itinerary from session history"""
+    from gradio_client import Client
+
+    client = Client(url, verbose=False)
+    for flow in range(flows):
+        city = CITIES[(user + flow) % len(CITIES)]
+        interests = f"{INTERESTS[flow % len(INTERESTS)]}, user {user}"
+        try:
+            outputs = _call(client, recorder, "/plan", city, interests, "mid-range", "3 days", "adventurous")
+            _call(client, recorder, "/follow_up")
+            stored_id = _stored_id(outputs)
+            if stored_id:
+                _call(client, recorder, "/history_entry", stored_id)
+            if open_sections:
+                _call(client, recorder, "/load_local_tips")
+        except Exception:
+            recorder.error()
+
+
+def run_level(url: str, users: int, flows: int, app_pid: int, open_sections: bool) -> dict:
+    """Drive ``users`` concurrent sessions and summarise the results"""
+    recorder = Recorder()
+    with RSSSampler(app_pid) as rss, ThreadPoolExecutor(max_workers=users) as pool:
+        started = time.perf_counter()
+        for future in [pool.submit(run_session, url, user, flows, recorder, open_sections)
+                       for user in range(users)]:
+            future.result()
+        elapsed = time.perf_counter() - started
+    requests = sum(len(samples) for samples in recorder.latency.values())
+    return {
+        "users": users,
+        "requests": requests,
+        "errors": recorder.errors,
+        "elapsed_s": elapsed,
+        "throughput_rps": requests / elapsed if elapsed else 0.0,
+        "plans_per_s": len(recorder.latency.get("/plan", [])) / elapsed if elapsed else 0.0,
+        "queue_wait": _percentiles(recorder.queue_wait),
+        "latency": {endpoint: _percentiles(samples) for endpoint, samples in recorder.latency.items()},
+        "peak_rss_mb": rss.peak,
+    }
+
+
+def _wait_until_up(url: str, process: subprocess.Popen, timeout: float):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("The app exited before it started serving")
+        try:
+            urllib.request.urlopen(f"{url}/config", timeout=1)
+            return
+        except OSError:
+            time.sleep(0.25)
+    raise RuntimeError(f"The app did not start within {timeout:.0f}s")
+
+
+def _app_environment(llm_url: str, keep_cache: bool) -> Dict[str, str]:
+    env = dict(os.environ)
+    env["LLM_BASE_URL"] = llm_url
+    env.setdefault("GROQ_API_KEY", "load-test")
+    # Measure the process, not Groq's rate limits; explicit settings still win
+    env.setdefault("LLM_REQUESTS_PER_SECOND", "10000")
+    env.setdefault("LLM_BURST", "10000")
+    env.setdefault("LLM_MAX_CONCURRENCY", "512")
+    env.setdefault("RESPONSE_CACHE_PATH", os.path.join(tempfile.mkdtemp(prefix="chaotic-load-"), "responses.sqlite3"))
+    if not keep_cache:
+        env.setdefault("RESPONSE_CACHE_TTL_SECONDS", "0")
+    env.setdefault("CONSOLE_OUTPUT", "false")
+    # Compacted history entries are what the /history_entry step reopens
+    env.setdefault("HISTORY_COMPACT_CHARS", "200")
+    return env
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Load test the Gradio app with simulated concurrent users")
+    parser.add_argument("--users", default="1,4,16,64", help="comma-separated concurrency levels to step through")
+    parser.add_argument("--flows", type=int, default=3,
+                        help="plan, follow-up and history flows per user at each level")
+    parser.add_argument("--open-sections", action="store_true", help="also open the local tips section each flow")
+    parser.add_argument("--port", type=int, default=7861, help="port for the app under test")
+    parser.add_argument("--ttft", type=float, default=0.3, help="stand-in LLM median time to first token")
+    parser.add_argument("--ttft-sigma", type=float, default=0.5)
+    parser.add_argument("--tokens-per-second", type=float, default=250.0)
+    parser.add_argument("--reply-tokens", type=int, default=300)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of stand-in LLM calls returning 429")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--keep-cache", action="store_true", help="let the app's response cache serve repeats")
+    parser.add_argument("--startup-timeout", type=float, default=120.0)
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--serve-app", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.serve_app:
+        serve_app(args.port)
+        return 0
+
+    profile = FakeLLMProfile(
+        ttft_seconds=args.ttft, ttft_sigma=args.ttft_sigma, tokens_per_second=args.tokens_per_second,
+        error_rate=args.error_rate, reply_tokens=args.reply_tokens, seed=args.seed,
+    )
+    llm_server = FakeLLMServer(profile).start()
+    url = f"http://127.0.0.1:{args.port}"
+    app = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), "--serve-app", "--port", str(args.port)],
+        env=_app_environment(llm_server.url, args.keep_cache),
+    )
+    print(f"🧪 Stand-in LLM on {llm_server.url}, app on {url} (pid {app.pid})")
+    results = []
+    try:
+        _wait_until_up(url, app, args.startup_timeout)
+        for users in [int(level) for level in args.users.split(",") if level.strip()]:
+            level = run_level(url, users, args.flows, app.pid, args.open_sections)
+            results.append(level)
+            plan = level["latency"].get("/plan", {})
+            history = level["latency"].get("/history_entry", {})
+            print(f"👥 {users:>4} users: {level['throughput_rps']:.2f} req/s, {level['plans_per_s']:.2f} plans/s, "
+                  f"plan p50/p95/p99 {plan.get('p50', 0):.2f}/{plan.get('p95', 0):.2f}/{plan.get('p99', 0):.2f}s, "
+                  f"history p50/p95 {history.get('p50', 0):.3f}/{history.get('p95', 0):.3f}s, "
+                  f"queue wait p95 {level['queue_wait'].get('p95', 0):.2f}s, "
+                  f"RSS {level['peak_rss_mb'] or 0:.0f} MB, {level['errors']} errors", flush=True)
+    finally:
+        app.terminate()
+        app.wait(timeout=30)
+        llm_server.shutdown()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
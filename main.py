@@ -3,6 +3,7 @@ from dotenv import load_dotenv
 import gradio as gr
 from travel_planner import TravelPlanner
 from cli_interface import run_cli_planner
+import config
 
 # Load environment variables
 load_dotenv()
@@ -20,6 +21,9 @@ def main():
     #     run_cli_planner()
     # else:
         # Launch Gradio interface
+    if config.METRICS_PORT:
+        from metrics_server import start_metrics_server
+        start_metrics_server(config.METRICS_PORT)
     planner = TravelPlanner()
     demo = planner.create_gradio_interface()
     demo.launch(share=True)
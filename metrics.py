@@ -0,0 +1,106 @@
+import threading
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+# Samples kept per metric for percentile estimates
+MAX_SAMPLES = 1000
+# Upper bounds (seconds) of the cumulative histogram buckets kept per metric
+HISTOGRAM_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_samples: Dict[str, deque] = {}
+# name -> [bucket counts..., total count, sum]; never trimmed, unlike _samples
+_histograms: Dict[str, List[float]] = {}
+_collectors: List[Callable[[], Dict[str, float]]] = []
+_lock = threading.Lock()
+
+
+def observe(name: str, value: float):
+    """Record one sample (in seconds) for the named metric"""
+    with _lock:
+        _samples.setdefault(name, deque(maxlen=MAX_SAMPLES)).append(value)
+        histogram = _histograms.setdefault(name, [0] * (len(HISTOGRAM_BUCKETS) + 2))
+        for index, bound in enumerate(HISTOGRAM_BUCKETS):
+            if value <= bound:
+                histogram[index] += 1
+        histogram[-2] += 1
+        histogram[-1] += value
+
+
+def reset():
+    """Forget every recorded sample; collectors stay registered"""
+    with _lock:
+        _samples.clear()
+        _histograms.clear()
+
+
+def register_collector(collect: Callable[[], Dict[str, float]]):
+    """Add a callable whose ``{name: value}`` readings are exported with the histograms"""
+    with _lock:
+        _collectors.append(collect)
+
+
+def _percentile(ordered: list, fraction: float) -> float:
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def percentile(name: str, fraction: float, min_samples: int = 1) -> Optional[float]:
+    """Percentile of the named metric, or None with fewer than ``min_samples`` samples"""
+    with _lock:
+        ordered = sorted(_samples.get(name, ()))
+    if len(ordered) < max(1, min_samples):
+        return None
+    return _percentile(ordered, fraction)
+
+
+def snapshot() -> Dict[str, Dict[str, float]]:
+    """Count, mean and percentiles for every recorded metric"""
+    with _lock:
+        samples = {name: sorted(values) for name, values in _samples.items()}
+    return {
+        name: {
+            "count": len(ordered),
+            "mean": sum(ordered) / len(ordered),
+            "p50": _percentile(ordered, 0.50),
+            "p95": _percentile(ordered, 0.95),
+            "p99": _percentile(ordered, 0.99),
+            "max": ordered[-1],
+        }
+        for name, ordered in samples.items()
+        if ordered
+    }
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"')
+
+
+def prometheus_text(prefix: str = "chaotic_compass") -> str:
+    """Every metric in the Prometheus text exposition format.
+
+    Latency metrics share one histogram family labelled by metric name.
+    Collector values ending in ``_total`` are exported as counters, the rest
+    as gauges.
+    """
+    with _lock:
+        histograms = {name: list(values) for name, values in _histograms.items()}
+        collectors = list(_collectors)
+
+    family = f"{prefix}_latency_seconds"
+    lines = [f"# HELP {family} Latency of traced spans and LLM calls", f"# TYPE {family} histogram"]
+    for name, values in sorted(histograms.items()):
+        label = f'name="{_escape(name)}"'
+        for bound, count in zip(HISTOGRAM_BUCKETS, values):
+            lines.append(f'{family}_bucket{{{label},le="{bound}"}} {count}')
+        lines.append(f'{family}_bucket{{{label},le="+Inf"}} {values[-2]}')
+        lines.append(f"{family}_count{{{label}}} {values[-2]}")
+        lines.append(f"{family}_sum{{{label}}} {values[-1]}")
+
+    gauges: Dict[str, float] = {}
+    for collect in collectors:
+        gauges.update(collect())
+    for name, value in sorted(gauges.items()):
+        metric = f"{prefix}_{name}"
+        kind = "counter" if name.endswith("_total") else "gauge"
+        lines.append(f"# TYPE {metric} {kind}")
+        lines.append(f"{metric} {float(value)}")
+    return "\n".join(lines) + "\n"
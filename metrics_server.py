@@ -0,0 +1,69 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict
+
+import config
+import llm_provider
+import metrics
+import tracing
+from llm_scheduler import get_scheduler
+from response_cache import get_response_cache
+from usage_ledger import ledger
+
+
+def _runtime_gauges() -> Dict[str, float]:
+    """Counters kept by the scheduler, cache, coalescing, routing and hedging layers"""
+    scheduler = get_scheduler().stats()
+    cache = get_response_cache().stats()
+    hedges = llm_provider.hedger.stats()
+    return {
+        "llm_concurrency_limit": scheduler["concurrency_limit"],
+        "llm_in_flight": scheduler["in_flight"],
+        "llm_retries_total": scheduler["retries"],
+        "llm_throttled_total": scheduler["throttled"],
+        "llm_coalesced_total": llm_provider.flights.coalesced,
+        "llm_fallbacks_total": llm_provider.fallbacks,
+        "llm_hedges_fired_total": hedges["fired"],
+        "llm_hedges_won_total": hedges["won"],
+        "llm_hedge_loser_tokens_total": hedges["loser_tokens"],
+        "llm_hedge_loser_cost_usd_total": hedges["loser_cost_usd"],
+        "response_cache_hits_total": cache["hits"],
+        "response_cache_misses_total": cache["misses"],
+        "response_cache_size": cache["size"],
+    }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/metrics":
+            body = metrics.prometheus_text().encode("utf-8")
+            content_type = "text/plain; version=0.0.4; charset=utf-8"
+        elif self.path == "/trace":
+            body = json.dumps(tracing.trace_events()).encode("utf-8")
+            content_type = "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port: int, host: str = config.METRICS_HOST) -> ThreadingHTTPServer:
+    """Serve Prometheus ``/metrics`` and the JSON ``/trace`` from a background thread.
+
+    Listens on loopback by default; the trace exposes prompt-level timings,
+    so bind it more widely only on a trusted network.
+    """
+    metrics.register_collector(_runtime_gauges)
+    metrics.register_collector(ledger.gauges)
+    server = ThreadingHTTPServer((host, port), _Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"📈 Metrics on http://{host}:{port}/metrics, trace on /trace")
+    return server
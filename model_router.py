@@ -0,0 +1,32 @@
+from typing import NamedTuple, Optional, Tuple
+
+import config
+from llm_scheduler import classify_error
+
+# Failures that move a request on to the next model in its route
+_FALLBACK_STATUS = {408, 429, 503, 504}  # timeout, rate limit, model over capacity
+_TIMEOUT_ERRORS = {"APITimeoutError", "ConnectTimeout", "ReadTimeout", "TimeoutError"}
+
+
+class Route(NamedTuple):
+    """Models to try for a section, primary first, and its completion token limit"""
+    models: Tuple[str, ...]
+    max_tokens: Optional[int]
+
+
+def route_for(section: str) -> Route:
+    """Resolve the model route for a section from LLM_SECTION_MODELS.
+
+    Sections without an entry use LLM_MODEL. The fallback models follow the
+    primary in LLM_FALLBACK_MODELS order, without repeating it.
+    """
+    model, max_tokens = config.LLM_SECTION_MODELS.get(section, (config.LLM_MODEL, None))
+    fallbacks = tuple(m for m in dict.fromkeys(config.LLM_FALLBACK_MODELS) if m != model)
+    return Route((model,) + fallbacks, max_tokens or config.LLM_DEFAULT_MAX_TOKENS)
+
+
+def should_fall_back(exc: Exception) -> bool:
+    """True if ``exc`` is a timeout or rate limit that another model may not hit"""
+    _, throttled = classify_error(exc)
+    status = getattr(exc, "status_code", None) or getattr(getattr(exc, "response", None), "status_code", None)
+    return throttled or status in _FALLBACK_STATUS or type(exc).__name__ in _TIMEOUT_ERRORS
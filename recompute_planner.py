@@ -0,0 +1,32 @@
+import hashlib
+import json
+from typing import Dict, List
+
+# PlannerState input fields that each generator node reads
+SECTION_DEPENDENCIES: Dict[str, tuple] = {
+    "create_main_itinerary": (
+        "city", "interests", "budget", "duration", "travel_style", "group_size",
+        "accommodation_type", "transportation", "dietary_restrictions",
+    ),
+    "generate_recommendations": ("city", "interests", "budget", "dietary_restrictions"),
+    "generate_local_tips": ("city",),
+    "generate_safety_info": ("city",),
+    "create_alternative_plans": ("city", "interests"),
+}
+
+
+def input_fingerprint(state: dict, node: str) -> str:
+    """Digest of the input fields ``node`` depends on"""
+    values = [state.get(field) for field in SECTION_DEPENDENCIES[node]]
+    payload = json.dumps(values, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def is_stale(state: dict, node: str) -> bool:
+    """Whether ``node``'s inputs changed since its output was last generated"""
+    return state.get("section_inputs", {}).get(node) != input_fingerprint(state, node)
+
+
+def stale_sections(state: dict, nodes: List[str]) -> List[str]:
+    """The subset of ``nodes`` that must be re-run for the current state"""
+    return [node for node in nodes if is_stale(state, node)]
@@ -0,0 +1,222 @@
+import re
+from typing import Dict, Iterable, List, Union
+
+from model_router import route_for
+from response_cache import ResponseCache
+
+# Common alternate names mapped to the city name used in prompts and cache keys
+CITY_ALIASES = {
+    "nyc": "New York",
+    "new york city": "New York",
+    "ny": "New York",
+    "la": "Los Angeles",
+    "sf": "San Francisco",
+    "san fran": "San Francisco",
+    "bombay": "Mumbai",
+    "calcutta": "Kolkata",
+    "madras": "Chennai",
+    "bangalore": "Bengaluru",
+    "peking": "Beijing",
+    "saigon": "Ho Chi Minh City",
+    "hcmc": "Ho Chi Minh City",
+    "rio": "Rio de Janeiro",
+    "cdmx": "Mexico City",
+    "st petersburg": "Saint Petersburg",
+    "st. petersburg": "Saint Petersburg",
+}
+
+# Qualifiers that only restate a city's country; any other qualifier ("Paris, Texas")
+# names a different place and is kept
+CITY_COUNTRIES = {
+    "Tokyo": {"japan", "jp"},
+    "Kyoto": {"japan", "jp"},
+    "Osaka": {"japan", "jp"},
+    "Seoul": {"south korea", "korea", "kr"},
+    "Beijing": {"china", "cn"},
+    "Shanghai": {"china", "cn"},
+    "Hong Kong": {"china", "hk"},
+    "Bangkok": {"thailand", "th"},
+    "Hanoi": {"vietnam", "vn"},
+    "Ho Chi Minh City": {"vietnam", "vn"},
+    "Singapore": {"singapore", "sg"},
+    "Mumbai": {"india", "in"},
+    "Delhi": {"india", "in"},
+    "New Delhi": {"india", "in"},
+    "Kolkata": {"india", "in"},
+    "Chennai": {"india", "in"},
+    "Bengaluru": {"india", "in"},
+    "Dubai": {"uae", "united arab emirates", "ae"},
+    "Istanbul": {"turkey", "türkiye", "tr"},
+    "Marrakech": {"morocco", "ma"},
+    "Cairo": {"egypt", "eg"},
+    "Cape Town": {"south africa", "za"},
+    "Paris": {"france", "fr"},
+    "Lyon": {"france", "fr"},
+    "London": {"uk", "united kingdom", "england", "gb"},
+    "Edinburgh": {"uk", "united kingdom", "scotland", "gb"},
+    "Dublin": {"ireland", "ie"},
+    "Amsterdam": {"netherlands", "the netherlands", "holland", "nl"},
+    "Berlin": {"germany", "de"},
+    "Munich": {"germany", "de"},
+    "Vienna": {"austria", "at"},
+    "Prague": {"czech republic", "czechia", "cz"},
+    "Budapest": {"hungary", "hu"},
+    "Rome": {"italy", "it"},
+    "Milan": {"italy", "it"},
+    "Florence": {"italy", "it"},
+    "Venice": {"italy", "it"},
+    "Barcelona": {"spain", "es"},
+    "Madrid": {"spain", "es"},
+    "Lisbon": {"portugal", "pt"},
+    "Athens": {"greece", "gr"},
+    "Copenhagen": {"denmark", "dk"},
+    "Stockholm": {"sweden", "se"},
+    "Saint Petersburg": {"russia", "ru"},
+    "Moscow": {"russia", "ru"},
+    "New York": {"usa", "us", "united states", "ny"},
+    "Los Angeles": {"usa", "us", "united states", "ca", "california"},
+    "San Francisco": {"usa", "us", "united states", "ca", "california"},
+    "Chicago": {"usa", "us", "united states", "il", "illinois"},
+    "Toronto": {"canada", "ca", "on", "ontario"},
+    "Vancouver": {"canada", "ca", "bc", "british columbia"},
+    "Mexico City": {"mexico", "mx"},
+    "Rio de Janeiro": {"brazil", "br"},
+    "Buenos Aires": {"argentina", "ar"},
+    "Sydney": {"australia", "au", "nsw"},
+    "Melbourne": {"australia", "au", "vic"},
+}
+
+# Words kept lowercase inside multi-word place names ("Rio de Janeiro")
+_NAME_PARTICLES = {
+    "de", "da", "do", "dos", "das", "del", "della", "di", "du", "des", "la", "le", "les",
+    "el", "of", "the", "on", "upon", "am", "an", "der", "y", "en", "sur",
+}
+
+BUDGETS = ["budget", "mid-range", "luxury"]
+BUDGET_ALIASES = {
+    "cheap": "budget",
+    "low": "budget",
+    "backpacker": "budget",
+    "mid": "mid-range",
+    "midrange": "mid-range",
+    "mid range": "mid-range",
+    "moderate": "mid-range",
+    "medium": "mid-range",
+    "high": "luxury",
+    "premium": "luxury",
+    "expensive": "luxury",
+}
+
+DURATIONS = ["1 day", "3 days", "1 week", "2 weeks"]
+DURATION_ALIASES = {
+    "day": "1 day",
+    "one day": "1 day",
+    "weekend": "3 days",
+    "three days": "3 days",
+    "week": "1 week",
+    "one week": "1 week",
+    "7 days": "1 week",
+    "two weeks": "2 weeks",
+    "fortnight": "2 weeks",
+    "14 days": "2 weeks",
+}
+
+TRAVEL_STYLES = ["adventurous", "relaxed", "cultural", "party", "family-friendly"]
+TRAVEL_STYLE_ALIASES = {
+    "adventure": "adventurous",
+    "relax": "relaxed",
+    "chill": "relaxed",
+    "culture": "cultural",
+    "nightlife": "party",
+    "family": "family-friendly",
+    "family friendly": "family-friendly",
+    "kids": "family-friendly",
+}
+
+
+def _clean(value: str) -> str:
+    """Lowercase and collapse whitespace"""
+    return re.sub(r"\s+", " ", (value or "").strip()).lower()
+
+
+def _coerce(value: str, choices: List[str], aliases: Dict[str, str]) -> str:
+    """Map free text onto one of ``choices``, keeping unrecognised text as-is"""
+    cleaned = _clean(value)
+    if cleaned in choices:
+        return cleaned
+    if cleaned in aliases:
+        return aliases[cleaned]
+    singular = re.sub(r"^(\d+) (day|week)s?$", r"\1 \2", cleaned)
+    for choice in choices:
+        if re.sub(r"s$", "", choice) == singular:
+            return choice
+    return cleaned
+
+
+def _place_name(text: str) -> str:
+    """Title-case a cleaned place name, keeping particles such as "de" lowercase"""
+    first = True
+
+    def capitalize(word: str) -> str:
+        nonlocal first
+        keep = not first and word in _NAME_PARTICLES
+        first = False
+        return word if keep else word[:1].upper() + word[1:]
+
+    return " ".join("-".join(capitalize(part) for part in word.split("-")) for word in text.split(" "))
+
+
+def _qualifier(text: str) -> str:
+    """Title-case a cleaned region qualifier, upper-casing codes such as "TX" or "D.C." """
+    return " ".join(
+        word.upper() if "." in word or len(word) <= 3 else _place_name(word)
+        for word in text.split(" ")
+    )
+
+
+def canonical_city(city: str) -> str:
+    """Canonical city name used in prompts and cache keys.
+
+    "tokyo", " Tokyo" and "Tokyo, Japan" all become "Tokyo"; a qualifier that
+    is not the city's own country is kept, so "Paris, Texas" stays distinct.
+    """
+    parts = [_clean(part) for part in (city or "").split(",")]
+    name, qualifiers = parts[0], [part for part in parts[1:] if part]
+    name = _place_name(_clean(CITY_ALIASES.get(name, name)))
+    countries = CITY_COUNTRIES.get(name, set())
+    kept = [_qualifier(qualifier) for qualifier in qualifiers if qualifier not in countries]
+    return ", ".join([name] + kept)
+
+
+def canonical_interests(interests: Union[str, Iterable[str]]) -> List[str]:
+    """Sorted, deduplicated, lowercase interests"""
+    if isinstance(interests, str):
+        interests = interests.split(",")
+    return sorted({_clean(i) for i in interests if _clean(i)})
+
+
+def canonical_itinerary_vars(prompt_vars: Dict[str, object]) -> Dict[str, str]:
+    """Normalise the full itinerary prompt variable set"""
+    return {
+        "city": canonical_city(prompt_vars["city"]),
+        "interests": ", ".join(canonical_interests(prompt_vars["interests"])),
+        "budget": _coerce(prompt_vars.get("budget", "mid-range"), BUDGETS, BUDGET_ALIASES),
+        "duration": _coerce(prompt_vars.get("duration", "3 days"), DURATIONS, DURATION_ALIASES),
+        "travel_style": _coerce(prompt_vars.get("travel_style", "adventurous"), TRAVEL_STYLES, TRAVEL_STYLE_ALIASES),
+        "group_size": _clean(prompt_vars.get("group_size", "solo")),
+        "accommodation_type": _clean(prompt_vars.get("accommodation_type", "hotel")),
+        "transportation": _clean(prompt_vars.get("transportation", "mixed")),
+        "dietary_restrictions": _clean(prompt_vars.get("dietary_restrictions", "none")),
+    }
+
+
+def itinerary_cache_key(prompt_vars: Dict[str, object]) -> str:
+    """Cache key for an itinerary request, stable across equivalent inputs"""
+    return ResponseCache.make_key(
+        "itinerary", model=route_for("itinerary").models[0], **canonical_itinerary_vars(prompt_vars)
+    )
+
+
+def city_cache_key(section: str, city: str) -> str:
+    """Cache key for a section whose prompt depends only on the city"""
+    return ResponseCache.make_key(section, model=route_for(section).models[0], city=canonical_city(city))
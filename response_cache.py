@@ -0,0 +1,150 @@
+import contextvars
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Awaitable, Callable, Iterator, List, Optional
+
+import config
+import tracing
+
+# Reasons not to store the value currently being produced for the cache
+_skips: contextvars.ContextVar[Optional[List[str]]] = contextvars.ContextVar("cache_skips", default=None)
+
+
+def skip_store(reason: str):
+    """Keep the value being produced out of the cache, e.g. a fallback model's answer"""
+    skips = _skips.get()
+    if skips is not None:
+        skips.append(reason)
+
+
+@contextmanager
+def producing() -> Iterator[List[str]]:
+    """Collect :func:`skip_store` calls made while producing a value; store it only if none were"""
+    token = _skips.set([])
+    try:
+        yield _skips.get()
+    finally:
+        _skips.reset(token)
+
+
+class ResponseCache:
+    """SQLite-backed LLM response cache with an LRU bound and a TTL"""
+
+    def __init__(self, path: str, max_entries: int, ttl_seconds: float):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+            "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)"
+        )
+
+    @staticmethod
+    def make_key(section: str, **params) -> str:
+        """Build a stable cache key from a section name and its prompt variables"""
+        payload = json.dumps({"section": section, **params}, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached value for ``key``, or None if it is missing or expired"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                tracing.annotate(cache="miss")
+                return None
+            value, created_at = row
+            if now - created_at > self.ttl_seconds:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.misses += 1
+                tracing.annotate(cache="expired")
+                return None
+            self._conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            tracing.annotate(cache="hit")
+            return value
+
+    def set(self, key: str, value: str):
+        """Store ``value`` and evict the least recently used entries over the bound"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?)",
+                (key, value, now, now),
+            )
+            self._conn.execute(
+                "DELETE FROM responses WHERE key IN ("
+                "SELECT key FROM responses ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def get_or_create(self, key: str, factory: Callable[[], str]) -> str:
+        """Return the cached value for ``key``, computing and storing it on a miss"""
+        value = self.get(key)
+        if value is None:
+            with producing() as skips:
+                value = factory()
+            if not skips:
+                self.set(key, value)
+        return value
+
+    async def aget_or_create(self, key: str, factory: Callable[[], Awaitable[str]]) -> str:
+        """Async counterpart of :meth:`get_or_create`"""
+        value = self.get(key)
+        if value is None:
+            with producing() as skips:
+                value = await factory()
+            if not skips:
+                self.set(key, value)
+        return value
+
+    def stats(self) -> dict:
+        """Hit/miss counters and current size"""
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "size": size,
+        }
+
+
+_cache: Optional[ResponseCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache:
+    """Return the process-wide response cache shared by the web and CLI paths"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache(
+                config.RESPONSE_CACHE_PATH,
+                max_entries=config.RESPONSE_CACHE_MAX_ENTRIES,
+                ttl_seconds=config.RESPONSE_CACHE_TTL_SECONDS,
+            )
+        return _cache
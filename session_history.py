@@ -0,0 +1,63 @@
+import hashlib
+from collections import deque
+from typing import Dict, Tuple
+
+import config
+
+SEPARATOR = "\n\n---\n\n"
+
+
+class SessionHistory:
+    """Bounded planning history for one session with incremental markdown rendering.
+
+    Only the newest ``max_entries`` entries are kept. The rendered markdown is
+    maintained by prepending each new entry and trimming the evicted one, so
+    adding an entry never re-renders the whole history. With compaction on,
+    itinerary bodies longer than ``compact_chars`` are stored once by content
+    digest and the rendered entry shows a preview that references it.
+    """
+
+    def __init__(self, max_entries: int = config.HISTORY_MAX_ENTRIES,
+                 compact_chars: int = config.HISTORY_COMPACT_CHARS):
+        self.max_entries = max_entries
+        self.compact_chars = compact_chars
+        self._entries = deque()  # (rendered entry, body digest or None)
+        self._bodies: Dict[str, Tuple[str, int]] = {}  # digest -> (body, reference count)
+        self._markdown = ""
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add(self, city: str, interests: str, itinerary: str) -> str:
+        """Record a generated itinerary and return the updated markdown"""
+        digest = None
+        body = itinerary
+        if self.compact_chars and len(itinerary) > self.compact_chars:
+            digest = hashlib.sha1(itinerary.encode("utf-8")).hexdigest()[:12]
+            stored, refs = self._bodies.get(digest, (itinerary, 0))
+            self._bodies[digest] = (stored, refs + 1)
+            body = (f"{itinerary[:self.compact_chars].rstrip()}…\n\n"
+                    f"_Full itinerary stored as `{digest}`; enter that id below to show it_")
+
+        entry = f"**City:** {city}\n**Interests:** {interests}\n{body}"
+        self._entries.appendleft((entry, digest))
+        self._markdown = entry + SEPARATOR + self._markdown if len(self._entries) > 1 else entry
+
+        if len(self._entries) > self.max_entries:
+            evicted, evicted_digest = self._entries.pop()
+            self._markdown = self._markdown[:-(len(SEPARATOR) + len(evicted))]
+            if evicted_digest is not None:
+                stored, refs = self._bodies[evicted_digest]
+                if refs > 1:
+                    self._bodies[evicted_digest] = (stored, refs - 1)
+                else:
+                    del self._bodies[evicted_digest]
+        return self._markdown
+
+    def body(self, digest: str) -> str:
+        """Full itinerary text for a compacted entry; KeyError once it has been evicted"""
+        return self._bodies[digest][0]
+
+    def render(self) -> str:
+        """Markdown for every kept entry, newest first"""
+        return self._markdown or "No history yet"
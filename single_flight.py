@@ -0,0 +1,156 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class _Broadcast:
+    """Replays one async stream to every subscriber, from its first item"""
+
+    def __init__(self):
+        self.items: List = []
+        self.done = False
+        self.error = None
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+
+    def _notify(self):
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def pump(self, source: AsyncIterator):
+        try:
+            try:
+                async for item in source:
+                    self.items.append(item)
+                    self._notify()
+            finally:
+                aclose = getattr(source, "aclose", None)
+                if aclose is not None:
+                    await aclose()
+        except Exception as exc:
+            self.error = exc
+        finally:
+            self.done = True
+            self._notify()
+
+    async def subscribe(self) -> AsyncIterator:
+        index = 0
+        while True:
+            changed = self._changed
+            while index < len(self.items):
+                yield self.items[index]
+                index += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            await changed.wait()
+
+
+class SingleFlight:
+    """Coalesce concurrent identical calls onto one in-flight execution.
+
+    Callers that arrive while a call with the same key is running wait for
+    that call and share its result, or its exception, instead of starting
+    their own.
+    """
+
+    def __init__(self):
+        self.coalesced = 0
+        self._lock = threading.Lock()
+        self._calls: Dict[str, Future] = {}
+        self._tasks: Dict[Tuple[int, str], asyncio.Task] = {}
+        self._streams: Dict[Tuple[int, str], _Broadcast] = {}
+        # Callers still waiting on each shared task or stream
+        self._waiters: Dict[object, int] = {}
+
+    def do(self, key: str, call: Callable[[], T]) -> T:
+        """Run ``call`` unless an identical call is already in flight"""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+            else:
+                self.coalesced += 1
+        if not leader:
+            return future.result()
+
+        try:
+            result = call()
+            future.set_result(result)
+            return result
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    async def ado(self, key: str, call: Callable[[], Awaitable[T]]) -> T:
+        """Async counterpart of :meth:`do`.
+
+        The shared call runs as its own task, so a cancelled caller does not
+        cancel it for the others; it is cancelled once every caller has left.
+        """
+        loop = asyncio.get_running_loop()
+        slot = (id(loop), key)
+        with self._lock:
+            task = self._tasks.get(slot)
+            if task is None:
+                task = self._tasks[slot] = loop.create_task(call())
+                task.add_done_callback(lambda _: self._forget(self._tasks, slot, task))
+            else:
+                self.coalesced += 1
+            self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            if self._leave(self._tasks, slot, task) and not task.done():
+                task.cancel()
+
+    async def astream(self, key: str, start: Callable[[], AsyncIterator[T]]) -> AsyncIterator[T]:
+        """Share one async stream between concurrent identical requests.
+
+        The shared stream is cancelled once every subscriber has left.
+        """
+        loop = asyncio.get_running_loop()
+        slot = (id(loop), key)
+        with self._lock:
+            broadcast = self._streams.get(slot)
+            if broadcast is None:
+                broadcast = self._streams[slot] = _Broadcast()
+                broadcast.task = loop.create_task(broadcast.pump(start()))
+                broadcast.task.add_done_callback(lambda _: self._forget(self._streams, slot, broadcast))
+            else:
+                self.coalesced += 1
+            self._waiters[broadcast] = self._waiters.get(broadcast, 0) + 1
+        try:
+            async for item in broadcast.subscribe():
+                yield item
+        finally:
+            if self._leave(self._streams, slot, broadcast) and not broadcast.done:
+                broadcast.task.cancel()
+
+    def _leave(self, calls: dict, slot, shared) -> bool:
+        """Drop one waiter from ``shared``; True if it was the last one.
+
+        An abandoned call is unregistered straight away, so a later caller
+        starts a fresh one instead of joining a call that is being cancelled.
+        """
+        with self._lock:
+            self._waiters[shared] -= 1
+            if self._waiters[shared]:
+                return False
+            del self._waiters[shared]
+            if calls.get(slot) is shared:
+                del calls[slot]
+            return True
+
+    def _forget(self, calls: dict, slot, shared):
+        with self._lock:
+            if calls.get(slot) is shared:
+                del calls[slot]
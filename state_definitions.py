@@ -1,9 +1,25 @@
-from typing import TypedDict, Annotated, List, Optional
-from langchain_core.messages import HumanMessage, AIMessage
+from typing import TypedDict, Annotated, Dict, List, Optional
+from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
+from context_compaction import ReplaceMessages
+
+def append_messages(left: list, right: list) -> list:
+    """Append reducer for messages; a ``ReplaceMessages`` update swaps the history out"""
+    if isinstance(right, ReplaceMessages):
+        return list(right)
+    return (left or []) + right
+
+def merge_dicts(left: Dict[str, str], right: Dict[str, str]) -> Dict[str, str]:
+    """Reducer that lets parallel branches each add their own keys"""
+    return {**(left or {}), **(right or {})}
 
 class PlannerState(TypedDict):
-    """State definition for the travel planner workflow"""
-    messages: Annotated[List[HumanMessage | AIMessage], "messages in the conversation"]
+    """State definition for the travel planner workflow.
+
+    Nodes return only the fields they change. ``messages`` is append-only:
+    a node returns just its new messages and the reducer adds them, except
+    for the compaction stage, which replaces the history.
+    """
+    messages: Annotated[List[HumanMessage | AIMessage | SystemMessage], append_messages]
     city: str
     interests: List[str]
     budget: str
@@ -21,4 +37,6 @@ class PlannerState(TypedDict):
     safety_info: str
     current_step: str
     user_satisfaction: Optional[bool]
-    refinement_requested: bool
\ No newline at end of file
+    refinement_requested: bool
+    # Input fingerprint each generator node last ran with (see recompute_planner)
+    section_inputs: Annotated[Dict[str, str], merge_dicts]
\ No newline at end of file
@@ -0,0 +1,47 @@
+import time
+from typing import AsyncIterator, Iterator, List, Optional
+
+from langchain_core.messages import BaseMessage
+
+import metrics
+from llm_provider import astream_llm, from_fallback, stream_llm
+
+
+def stream_chat(messages: List[BaseMessage], section: str,
+                fallbacks: Optional[List[str]] = None) -> Iterator[str]:
+    """Yield text chunks from the chat model as they arrive.
+
+    Records ``<section>.ttft`` (time to first token) and ``<section>.total``
+    latency samples in :mod:`metrics`. A fallback model that answered is
+    appended to ``fallbacks``, so the caller can keep the text out of the
+    response cache.
+    """
+    started = time.perf_counter()
+    first_token = True
+    for chunk in stream_llm(messages, section):
+        if fallbacks is not None and from_fallback(chunk):
+            fallbacks.append(chunk.response_metadata["fallback_model"])
+        if not chunk.content:
+            continue
+        if first_token:
+            metrics.observe(f"{section}.ttft", time.perf_counter() - started)
+            first_token = False
+        yield chunk.content
+    metrics.observe(f"{section}.total", time.perf_counter() - started)
+
+
+async def astream_chat(messages: List[BaseMessage], section: str,
+                       fallbacks: Optional[List[str]] = None) -> AsyncIterator[str]:
+    """Async counterpart of :func:`stream_chat`"""
+    started = time.perf_counter()
+    first_token = True
+    async for chunk in astream_llm(messages, section):
+        if fallbacks is not None and from_fallback(chunk):
+            fallbacks.append(chunk.response_metadata["fallback_model"])
+        if not chunk.content:
+            continue
+        if first_token:
+            metrics.observe(f"{section}.ttft", time.perf_counter() - started)
+            first_token = False
+        yield chunk.content
+    metrics.observe(f"{section}.total", time.perf_counter() - started)
@@ -0,0 +1,38 @@
+import json
+
+from batch_planner import completed_ids, read_requests, request_id
+
+
+def _write(path, lines):
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    return str(path)
+
+
+def test_request_id_prefers_the_id_field():
+    assert request_id({"id": 7, "city": "Tokyo"}) == "7"
+    assert request_id({"city": "Tokyo", "interests": "food"}) == request_id({"interests": "food", "city": "Tokyo"})
+
+
+def test_malformed_lines_are_reported_and_reading_continues(tmp_path):
+    path = _write(tmp_path / "trips.jsonl", [
+        json.dumps({"id": "a", "city": "Tokyo"}),
+        '{"id": "b", "city": ',
+        "[1, 2]",
+        "",
+        json.dumps({"id": "c", "city": "Lisbon"}),
+    ])
+    results = list(read_requests(path, skip={"c"}))
+    assert [(rid, record) for rid, record, error in results if error is None] == [("a", {"id": "a", "city": "Tokyo"})]
+    errors = [error for _, _, error in results if error is not None]
+    assert len(errors) == 2
+    assert errors[0].startswith("Line 2 is not valid JSON")
+    assert errors[1] == "Line 3 is not a JSON object"
+
+
+def test_completed_ids_skip_failures_and_partial_lines(tmp_path):
+    path = _write(tmp_path / "plans.jsonl", [
+        json.dumps({"id": "a", "status": "ok"}),
+        json.dumps({"id": "b", "status": "error"}),
+        '{"id": "c", "sta',
+    ])
+    assert completed_ids(path) == {"a"}
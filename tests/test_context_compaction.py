@@ -0,0 +1,49 @@
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+from context_compaction import ITINERARY_MESSAGE, SUMMARY_HEADER, compact_messages, estimate_tokens
+
+
+def _itinerary(version: int) -> AIMessage:
+    return AIMessage(content=f"Itinerary v{version}\n" + "day plan " * 100, name=ITINERARY_MESSAGE)
+
+
+def test_conversation_within_budget_is_left_alone():
+    messages = [HumanMessage(content="Selected city: Tokyo"), _itinerary(1)]
+    assert compact_messages(messages, estimate_tokens(messages)) is None
+
+
+def test_superseded_itineraries_are_dropped_first():
+    messages = [
+        HumanMessage(content="Selected city: Tokyo"),
+        _itinerary(1),
+        HumanMessage(content="Requested modification: budget -> luxury"),
+        _itinerary(2),
+    ]
+    compacted = compact_messages(messages, estimate_tokens(messages) - 1)
+    assert compacted == [messages[0], messages[2], messages[3]]
+
+
+def test_oldest_turns_are_folded_into_a_summary():
+    turns = [HumanMessage(content=f"Answer {i}: " + "detail " * 40) for i in range(10)]
+    messages = turns + [_itinerary(1), HumanMessage(content="Requested modification: day 2 -> museums")]
+    budget = estimate_tokens(messages[-3:]) + 60
+    compacted = compact_messages(messages, budget)
+
+    summary = compacted[0]
+    assert isinstance(summary, SystemMessage)
+    assert summary.content.startswith(SUMMARY_HEADER)
+    assert "- human: Answer 0:" in summary.content
+    assert compacted[-2:] == messages[-2:]
+    assert estimate_tokens(compacted) < estimate_tokens(messages)
+
+
+def test_an_earlier_summary_is_carried_forward():
+    turns = [HumanMessage(content=f"Answer {i}: " + "detail " * 40) for i in range(6)]
+    first = compact_messages(turns + [_itinerary(1)], estimate_tokens([_itinerary(1)]) + 60)
+    more = [HumanMessage(content=f"Later {i}: " + "detail " * 40) for i in range(4)]
+    second = compact_messages(first + more + [_itinerary(2)], estimate_tokens([_itinerary(2)]) + 80)
+
+    summary = second[0].content
+    assert summary.count(SUMMARY_HEADER) == 1
+    assert "Answer 0:" in summary and "Later 0:" in summary
+    assert second[-1].content.startswith("Itinerary v2")
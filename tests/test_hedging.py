@@ -0,0 +1,83 @@
+import asyncio
+import time
+
+from hedging import Hedger
+
+
+def _hedger(max_ratio=1.0):
+    return Hedger(percentile=0.95, default_delay=0.02, min_samples=1000, max_ratio=max_ratio)
+
+
+def _slow_first(attempts_made):
+    """The first attempt is slow to its first token, the hedge is fast"""
+    def start(attempt):
+        index = len(attempts_made)
+        attempts_made.append(attempt)
+        delay = 0.3 if index == 0 else 0.0
+        def chunks():
+            time.sleep(delay)
+            for word in ["fast " if index else "slow ", "plan"]:
+                attempt.used(1, 0.5)
+                yield word
+                time.sleep(0.01)
+        return chunks()
+    return start
+
+
+def test_sync_hedge_wins_and_loser_cost_is_counted():
+    hedger = _hedger()
+    attempts = []
+    assert "".join(hedger.stream("itinerary", _slow_first(attempts))) == "fast plan"
+    time.sleep(0.4)  # the loser stops at its next chunk
+    stats = hedger.stats()
+    assert (stats["fired"], stats["won"]) == (1, 1)
+    assert attempts[0].lost and not attempts[1].lost
+    assert stats["loser_tokens"] == attempts[0].tokens >= 1
+    assert stats["loser_cost_usd"] == attempts[0].cost_usd
+
+
+def test_fast_first_request_is_not_hedged():
+    hedger = _hedger()
+
+    def start(attempt):
+        return iter(["quick ", "plan"])
+
+    assert "".join(hedger.stream("itinerary", start)) == "quick plan"
+    assert hedger.stats()["fired"] == 0
+
+
+def test_budget_limits_how_often_the_hedge_fires():
+    hedger = _hedger(max_ratio=0.0)
+    attempts = []
+    assert "".join(hedger.stream("itinerary", _slow_first(attempts))) == "slow plan"
+    assert hedger.stats()["fired"] == 0
+    assert len(attempts) == 1
+
+
+def test_async_loser_is_cancelled_and_its_usage_counted():
+    hedger = _hedger()
+    attempts, closed = [], []
+
+    def start(attempt):
+        index = len(attempts)
+        attempts.append(attempt)
+
+        async def chunks():
+            try:
+                attempt.used(10, 0.1)  # prompt tokens are billed once the request is sent
+                await asyncio.sleep(0.5 if index == 0 else 0.0)
+                yield "fast " if index else "slow "
+                yield "plan"
+            finally:
+                closed.append(index)
+        return chunks()
+
+    async def main():
+        return "".join([item async for item in hedger.astream("itinerary", start)])
+
+    assert asyncio.run(main()) == "fast plan"
+    stats = hedger.stats()
+    assert (stats["fired"], stats["won"]) == (1, 1)
+    assert sorted(closed) == [0, 1]
+    assert attempts[0].lost
+    assert stats["loser_tokens"] == 10
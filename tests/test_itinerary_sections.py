@@ -0,0 +1,49 @@
+from itinerary_sections import parse_itinerary, requested_days
+
+ITINERARY = (
+    "Here is your chaotic plan.\n\n"
+    "## Day 1: Arrival\nRamen in Shinjuku.\n\n"
+    "## Day 2: Temples\nAsakusa at dawn.\nDay 2 is the busiest day, so pace yourself.\n\n"
+    "**Day 3 - Departure**\nLast-minute shopping.\n"
+)
+
+
+def test_render_reproduces_the_text():
+    assert parse_itinerary(ITINERARY).render() == ITINERARY
+    assert parse_itinerary("No days here").render() == "No days here"
+
+
+def test_headings_need_markup_or_punctuation():
+    document = parse_itinerary(ITINERARY)
+    assert [day.number for day in document.days] == [1, 2, 3]
+    assert "pace yourself" in document.day(2).text
+    assert [day.number for day in parse_itinerary("Day 1:\nA\nDay 2 -\nB\nDay 3\nC\n").days] == [1, 2, 3]
+
+
+def test_fragments_of_the_same_day_are_merged():
+    document = parse_itinerary("## Day 2: Morning\nA\n## Day 2: Evening\nB\n## Day 3\nC\n")
+    assert [day.number for day in document.days] == [2, 3]
+    assert document.day(2).text == "## Day 2: Morning\nA\n## Day 2: Evening\nB\n"
+
+
+def test_replace_day_swaps_the_whole_day():
+    document = parse_itinerary(ITINERARY)
+    document.replace_day(2, "## Day 2: Museums\nThe Mori Art Museum.")
+    rendered = document.render()
+    assert "Asakusa" not in rendered and "pace yourself" not in rendered
+    assert rendered == ITINERARY.replace(
+        "## Day 2: Temples\nAsakusa at dawn.\nDay 2 is the busiest day, so pace yourself.",
+        "## Day 2: Museums\nThe Mori Art Museum.",
+    )
+
+
+def test_context_lists_each_other_day_once():
+    context = parse_itinerary(ITINERARY).context_for(2)
+    assert context == "- Day 1: Arrival\n- Day 3 - Departure"
+
+
+def test_requested_days():
+    assert requested_days("day 3") == [3]
+    assert requested_days("days 2-4") == [2, 3, 4]
+    assert requested_days("Day 2 and 5: more food") == [2, 5]
+    assert requested_days("budget: luxury") == []
@@ -0,0 +1,137 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from llm_scheduler import PRIORITY_HIGH, PRIORITY_LOW, AdaptiveLimiter, LLMScheduler, TokenBucket
+
+
+def _limiter(initial=4, reserved_fraction=0.25, bucket=None):
+    return AdaptiveLimiter(initial, minimum=1, maximum=16, reserved_fraction=reserved_fraction, bucket=bucket)
+
+
+def test_throttling_halves_the_limit_and_success_grows_it():
+    limiter = _limiter(initial=8)
+    limiter.acquire(PRIORITY_HIGH)
+    limiter.release("throttled")
+    assert limiter.limit == 4
+    limiter.acquire(PRIORITY_HIGH)
+    limiter.release("ok")
+    assert limiter.limit == pytest.approx(4.25)
+    assert limiter.in_flight == 0
+
+
+def test_reserved_slots_are_kept_for_high_priority():
+    limiter = _limiter(initial=4, reserved_fraction=0.25)
+    for _ in range(3):
+        limiter.acquire(PRIORITY_LOW)
+
+    async def main():
+        low = asyncio.ensure_future(limiter.aacquire(PRIORITY_LOW))
+        await asyncio.wait_for(limiter.aacquire(PRIORITY_HIGH), timeout=1)
+        await asyncio.sleep(0.01)
+        assert not low.done()
+        low.cancel()
+
+    asyncio.run(main())
+    assert limiter.in_flight == 4
+
+
+def test_queued_high_priority_callers_go_first():
+    limiter = _limiter(initial=1)
+    limiter.acquire(PRIORITY_HIGH)
+    order = []
+
+    async def waiter(name, priority):
+        await limiter.aacquire(priority)
+        order.append(name)
+        limiter.release("error")
+
+    async def main():
+        tasks = [asyncio.ensure_future(waiter(f"low{i}", PRIORITY_LOW)) for i in range(3)]
+        await asyncio.sleep(0.01)
+        tasks.append(asyncio.ensure_future(waiter("high", PRIORITY_HIGH)))
+        await asyncio.sleep(0.01)
+        limiter.release("error")
+        await asyncio.gather(*tasks)
+
+    asyncio.run(main())
+    assert order == ["high", "low0", "low1", "low2"]
+
+
+def test_rate_tokens_are_handed_out_in_priority_order():
+    limiter = _limiter(initial=16, bucket=TokenBucket(rate=50.0, capacity=1.0))
+    order = []
+
+    def take(name, priority):
+        limiter.acquire(priority)
+        order.append(name)
+
+    limiter.acquire(PRIORITY_LOW)  # drains the bucket
+    threads = [threading.Thread(target=take, args=(f"low{i}", PRIORITY_LOW)) for i in range(5)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.005)
+    high = threading.Thread(target=take, args=("high", PRIORITY_HIGH))
+    high.start()
+    for thread in threads + [high]:
+        thread.join(timeout=2)
+    assert order[0] == "high"
+    assert sorted(order[1:]) == [f"low{i}" for i in range(5)]
+
+
+def test_cancelled_waiter_does_not_keep_a_slot():
+    limiter = _limiter(initial=1)
+    limiter.acquire(PRIORITY_HIGH)
+
+    async def main():
+        waiting = asyncio.ensure_future(limiter.aacquire(PRIORITY_HIGH))
+        await asyncio.sleep(0.01)
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+        limiter.release("ok")
+        await asyncio.wait_for(limiter.aacquire(PRIORITY_HIGH), timeout=1)
+
+    asyncio.run(main())
+    assert limiter.in_flight == 1
+
+
+class RateLimited(Exception):
+    status_code = 429
+
+
+def test_scheduler_retries_throttled_calls():
+    scheduler = LLMScheduler(rate=1000, burst=100, initial_concurrency=4, min_concurrency=1, max_concurrency=8,
+                             reserved_fraction=0.25, max_retries=2, base_delay=0.0, max_delay=0.0)
+    attempts = []
+
+    def call():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise RateLimited()
+        return "ok"
+
+    assert scheduler.run(call, PRIORITY_HIGH) == "ok"
+    assert scheduler.stats()["retries"] == 2
+    assert scheduler.stats()["throttled"] == 2
+    assert scheduler.limiter.in_flight == 0
+
+
+def test_a_throttle_handled_by_the_caller_still_backs_off():
+    scheduler = LLMScheduler(rate=1000, burst=100, initial_concurrency=8, min_concurrency=1, max_concurrency=16,
+                             reserved_fraction=0.25, max_retries=0, base_delay=0.0, max_delay=0.0)
+
+    def call_with_fallback():
+        try:
+            raise RateLimited()
+        except RateLimited as exc:
+            scheduler.record_throttle(exc)
+        return "answered by the fallback model"
+
+    scheduler.run(call_with_fallback, PRIORITY_HIGH)
+    assert scheduler.stats()["throttled"] == 1
+    assert scheduler.limiter.limit < 8
+    scheduler.record_throttle(TimeoutError())
+    assert scheduler.stats()["throttled"] == 1
@@ -0,0 +1,27 @@
+from request_keys import canonical_city, canonical_itinerary_vars, city_cache_key, itinerary_cache_key
+
+
+def test_city_variants_share_one_name():
+    assert canonical_city("tokyo") == canonical_city(" Tokyo ") == canonical_city("Tokyo, Japan") == "Tokyo"
+
+
+def test_city_aliases_match_typed_names():
+    assert canonical_city("rio") == canonical_city("rio de janeiro") == canonical_city("Rio De Janeiro")
+    assert canonical_city("rio") == "Rio de Janeiro"
+    assert canonical_city("nyc") == canonical_city("New York, NY") == "New York"
+
+
+def test_other_qualifiers_are_kept():
+    assert canonical_city("Paris, Texas") == "Paris, Texas"
+    assert canonical_city("paris, tx") == "Paris, TX"
+    assert canonical_city("Washington, D.C.") == "Washington, D.C."
+    assert city_cache_key("local_tips", "Paris, Texas") != city_cache_key("local_tips", "Paris, France")
+
+
+def test_equivalent_itinerary_inputs_share_a_key():
+    first = {"city": "tokyo, japan", "interests": "Food, anime", "budget": "cheap",
+             "duration": "3 Days", "travel_style": "adventure"}
+    second = {"city": "Tokyo", "interests": ["anime", "food", "food"], "budget": "budget",
+              "duration": "3 days", "travel_style": "adventurous"}
+    assert canonical_itinerary_vars(first) == canonical_itinerary_vars(second)
+    assert itinerary_cache_key(first) == itinerary_cache_key(second)
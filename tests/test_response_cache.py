@@ -0,0 +1,73 @@
+import response_cache
+from response_cache import ResponseCache, skip_store
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _cache(tmp_path, monkeypatch, max_entries=3, ttl_seconds=60):
+    clock = Clock()
+    monkeypatch.setattr(response_cache.time, "time", clock)
+    return ResponseCache(str(tmp_path / "responses.sqlite3"), max_entries, ttl_seconds), clock
+
+
+def test_key_ignores_parameter_order():
+    assert ResponseCache.make_key("tips", city="Tokyo", model="m") == ResponseCache.make_key("tips", model="m", city="Tokyo")
+    assert ResponseCache.make_key("tips", city="Tokyo") != ResponseCache.make_key("safety", city="Tokyo")
+
+
+def test_entries_expire_after_the_ttl(tmp_path, monkeypatch):
+    cache, clock = _cache(tmp_path, monkeypatch, ttl_seconds=60)
+    cache.set("key", "value")
+    clock.now += 59
+    assert cache.get("key") == "value"
+    clock.now += 2
+    assert cache.get("key") is None
+    assert cache.stats() == {"hits": 1, "misses": 1, "hit_rate": 0.5, "size": 0}
+
+
+def test_least_recently_used_entry_is_evicted(tmp_path, monkeypatch):
+    cache, clock = _cache(tmp_path, monkeypatch, max_entries=2)
+    cache.set("a", "1")
+    clock.now += 1
+    cache.set("b", "2")
+    clock.now += 1
+    assert cache.get("a") == "1"  # "b" is now the least recently used
+    clock.now += 1
+    cache.set("c", "3")
+    assert cache.get("b") is None
+    assert cache.get("a") == "1"
+    assert cache.get("c") == "3"
+
+
+def test_get_or_create_only_computes_on_a_miss(tmp_path, monkeypatch):
+    cache, _ = _cache(tmp_path, monkeypatch)
+    calls = []
+    factory = lambda: calls.append(1) or "value"
+    assert cache.get_or_create("key", factory) == "value"
+    assert cache.get_or_create("key", factory) == "value"
+    assert len(calls) == 1
+
+
+def test_entries_survive_a_restart(tmp_path, monkeypatch):
+    cache, _ = _cache(tmp_path, monkeypatch)
+    cache.set("key", "value")
+    reopened, _ = _cache(tmp_path, monkeypatch)
+    assert reopened.get("key") == "value"
+
+
+def test_values_marked_by_skip_store_are_not_cached(tmp_path, monkeypatch):
+    cache, _ = _cache(tmp_path, monkeypatch)
+
+    def fallback_answer():
+        skip_store("fallback")
+        return "smaller model's plan"
+
+    assert cache.get_or_create("k", fallback_answer) == "smaller model's plan"
+    assert cache.get_or_create("k", lambda: "primary plan") == "primary plan"
+    assert cache.get("k") == "primary plan"
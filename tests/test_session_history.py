@@ -0,0 +1,39 @@
+import pytest
+
+from session_history import SEPARATOR, SessionHistory
+
+
+def test_renders_newest_first():
+    history = SessionHistory(max_entries=5, compact_chars=0)
+    history.add("Tokyo", "food", "plan one")
+    markdown = history.add("Paris", "art", "plan two")
+    assert markdown == history.render()
+    assert markdown.index("Paris") < markdown.index("Tokyo")
+
+
+def test_evicts_oldest_entry_and_matches_a_full_render():
+    history = SessionHistory(max_entries=2, compact_chars=0)
+    for city in ["Tokyo", "Paris", "Lisbon"]:
+        markdown = history.add(city, "food", f"plan for {city}")
+    assert len(history) == 2
+    assert "Tokyo" not in markdown
+    assert markdown == SEPARATOR.join(
+        f"**City:** {city}\n**Interests:** food\nplan for {city}" for city in ["Lisbon", "Paris"]
+    )
+
+
+def test_compacted_bodies_are_shared_and_released_on_eviction():
+    itinerary = "Day 1: " + "x" * 200
+    history = SessionHistory(max_entries=2, compact_chars=20)
+    markdown = history.add("Tokyo", "food", itinerary)
+    digest = markdown.split("`")[1]
+    assert history.body(digest) == itinerary
+    assert itinerary not in markdown
+
+    history.add("Tokyo", "food", itinerary)
+    history.add("Paris", "art", "short plan")
+    assert history.body(digest) == itinerary  # still referenced by the second entry
+
+    history.add("Lisbon", "art", "short plan")
+    with pytest.raises(KeyError):
+        history.body(digest)
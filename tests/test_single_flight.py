@@ -0,0 +1,150 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from single_flight import SingleFlight
+
+
+def test_concurrent_callers_share_one_result():
+    flights = SingleFlight()
+    calls = []
+    started = threading.Event()
+
+    def call():
+        calls.append(1)
+        started.set()
+        time.sleep(0.05)
+        return "plan"
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flights.do("key", call)))
+    leader.start()
+    started.wait()
+    follower = threading.Thread(target=lambda: results.append(flights.do("key", call)))
+    follower.start()
+    leader.join()
+    follower.join()
+    assert results == ["plan", "plan"]
+    assert len(calls) == 1
+    assert flights.coalesced == 1
+
+
+def test_async_callers_share_one_result_and_error():
+    flights = SingleFlight()
+    calls = []
+
+    async def ok():
+        calls.append("ok")
+        await asyncio.sleep(0.01)
+        return "plan"
+
+    async def failing():
+        calls.append("failing")
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    async def main():
+        results = await asyncio.gather(flights.ado("a", ok), flights.ado("a", ok))
+        errors = await asyncio.gather(flights.ado("b", failing), flights.ado("b", failing),
+                                      return_exceptions=True)
+        return results, errors
+
+    results, errors = asyncio.run(main())
+    assert results == ["plan", "plan"]
+    assert [type(error) for error in errors] == [ValueError, ValueError]
+    assert calls == ["ok", "failing"]
+
+
+def test_call_is_cancelled_when_its_last_caller_leaves():
+    flights = SingleFlight()
+    cancelled = []
+
+    async def slow():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    async def main():
+        first = asyncio.ensure_future(flights.ado("key", slow))
+        second = asyncio.ensure_future(flights.ado("key", slow))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        await asyncio.sleep(0.01)
+        assert not cancelled  # the second caller is still waiting
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(second, timeout=0.01)
+        await asyncio.sleep(0.01)
+        assert cancelled == [True]
+        # A new caller starts a fresh call rather than joining the cancelled one
+        assert await flights.ado("key", lambda: asyncio.sleep(0, result="fresh")) == "fresh"
+
+    asyncio.run(main())
+
+
+async def _numbers(count, delay, log):
+    try:
+        for number in range(count):
+            await asyncio.sleep(delay)
+            yield number
+    finally:
+        log.append("closed")
+
+
+def test_late_subscriber_replays_the_stream_from_the_start():
+    flights = SingleFlight()
+    log = []
+
+    async def consume(delay):
+        await asyncio.sleep(delay)
+        return [item async for item in flights.astream("key", lambda: _numbers(5, 0.01, log))]
+
+    async def main():
+        return await asyncio.gather(consume(0), consume(0.025))
+
+    first, late = asyncio.run(main())
+    assert first == late == [0, 1, 2, 3, 4]
+    assert log == ["closed"]
+    assert flights.coalesced == 1
+
+
+def test_stream_error_reaches_every_subscriber():
+    flights = SingleFlight()
+
+    async def failing():
+        yield "partial"
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    async def consume():
+        items = []
+        with pytest.raises(ValueError):
+            async for item in flights.astream("key", failing):
+                items.append(item)
+        return items
+
+    async def main():
+        return await asyncio.gather(consume(), consume())
+
+    assert asyncio.run(main()) == [["partial"], ["partial"]]
+
+
+def test_stream_is_cancelled_when_every_subscriber_leaves():
+    flights = SingleFlight()
+    log = []
+
+    async def main():
+        async def take_two():
+            stream = flights.astream("key", lambda: _numbers(100, 0.01, log))
+            items = [await stream.__anext__(), await stream.__anext__()]
+            await stream.aclose()
+            return items
+
+        assert await take_two() == [0, 1]
+        await asyncio.sleep(0.05)
+
+    asyncio.run(main())
+    assert log == ["closed"]
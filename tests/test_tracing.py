@@ -0,0 +1,49 @@
+import threading
+import time
+
+import tracing
+
+
+def _finished_span(name):
+    return next(span for span in reversed(tracing._finished) if span.name == name)
+
+
+def test_nested_spans_and_self_time():
+    with tracing.span("test.parent"):
+        with tracing.span("test.child"):
+            time.sleep(0.02)
+        time.sleep(0.01)
+    parent, child = _finished_span("test.parent"), _finished_span("test.child")
+    assert child.parent_id == parent.span_id
+    assert 0.005 <= parent.self_time < parent.duration - 0.015
+
+
+def test_parallel_children_are_counted_once():
+    def branch(name):
+        with tracing.span(name):
+            time.sleep(0.05)
+
+    with tracing.span("test.fanout"):
+        parent = tracing.current_span()
+        threads = [
+            threading.Thread(target=tracing.contextvars.copy_context().run, args=(branch, f"test.branch{i}"))
+            for i in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    assert parent.child_time <= parent.duration
+    assert parent.self_time >= 0
+    assert parent.to_event()["args"]["self_time_ms"] >= 0
+
+
+def test_traced_generator_records_first_token():
+    @tracing.traced("test.stream")
+    def stream():
+        time.sleep(0.01)
+        yield "token"
+
+    assert list(stream()) == ["token"]
+    span = _finished_span("test.stream")
+    assert span.ttft is not None and span.ttft <= span.duration
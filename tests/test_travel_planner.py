@@ -0,0 +1,50 @@
+import asyncio
+
+import config
+import travel_planner
+from response_cache import ResponseCache
+
+TOKENS = [f"word{i} " for i in range(300)]
+
+
+def _planner(tmp_path, monkeypatch, interval):
+    cache = ResponseCache(str(tmp_path / "responses.sqlite3"), 10, 60)
+    monkeypatch.setattr(travel_planner, "get_response_cache", lambda: cache)
+    monkeypatch.setattr(config, "STREAM_UPDATE_INTERVAL_SECONDS", interval)
+    return travel_planner.TravelPlanner(), cache
+
+
+def test_stream_updates_are_throttled_and_end_with_the_full_text(tmp_path, monkeypatch):
+    planner, cache = _planner(tmp_path, monkeypatch, interval=60)
+    monkeypatch.setattr(travel_planner, "stream_chat", lambda messages, section, fallbacks=None: iter(TOKENS))
+    updates = list(planner.stream_itinerary("Tokyo", "food"))
+    # The first token is shown at once, then nothing until the final text
+    assert updates == [TOKENS[0], "".join(TOKENS)]
+    assert list(planner.stream_itinerary("Tokyo", "food")) == ["".join(TOKENS)]
+
+
+def test_async_stream_updates_are_throttled(tmp_path, monkeypatch):
+    planner, _ = _planner(tmp_path, monkeypatch, interval=60)
+
+    async def astream_chat(messages, section, fallbacks=None):
+        for token in TOKENS:
+            yield token
+
+    monkeypatch.setattr(travel_planner, "astream_chat", astream_chat)
+
+    async def collect():
+        return [partial async for partial in planner.astream_itinerary("Tokyo", "food")]
+
+    assert asyncio.run(collect()) == [TOKENS[0], "".join(TOKENS)]
+
+
+def test_fallback_answers_are_not_cached(tmp_path, monkeypatch):
+    planner, cache = _planner(tmp_path, monkeypatch, interval=0)
+
+    def stream_chat(messages, section, fallbacks=None):
+        fallbacks.append("smaller-model")
+        return iter(TOKENS)
+
+    monkeypatch.setattr(travel_planner, "stream_chat", stream_chat)
+    assert list(planner.stream_itinerary("Tokyo", "food"))[-1] == "".join(TOKENS)
+    assert cache.stats()["size"] == 0
@@ -0,0 +1,251 @@
+import contextvars
+import functools
+import inspect
+import itertools
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import AsyncIterator, Callable, Iterator, List, Optional, Tuple
+
+import config
+import metrics
+
+_current: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("current_span", default=None)
+_ids = itertools.count(1)
+_finished: deque = deque(maxlen=config.TRACE_MAX_SPANS)
+_lock = threading.Lock()
+# Offset from perf_counter to wall-clock time, for trace timestamps
+_EPOCH = time.time() - time.perf_counter()
+
+
+class Span:
+    """One timed operation: a workflow node, a planner method or an LLM call.
+
+    ``self_time`` is the duration minus the time covered by nested spans,
+    i.e. the time spent locally (prompt formatting, parsing, state handling)
+    rather than waiting on the network. Overlapping children, such as the
+    parallel fan-out branches, are counted once.
+    """
+
+    def __init__(self, name: str, parent: Optional["Span"], attributes: dict):
+        self.name = name
+        self.span_id = next(_ids)
+        self.parent_id = parent.span_id if parent else None
+        self.parent = parent
+        self.attributes = dict(attributes)
+        self.thread_id = threading.get_ident()
+        self.started = time.perf_counter()
+        self.duration: Optional[float] = None
+        self.ttft: Optional[float] = None
+        self.retries = 0
+        self.cache: Optional[str] = None
+        self.error: Optional[str] = None
+        # (start, end) of each finished child; children may finish on other threads
+        self._children: List[Tuple[float, float]] = []
+        self._children_lock = threading.Lock()
+
+    def first_token(self):
+        """Mark the first streamed token, once"""
+        if self.ttft is None:
+            self.ttft = time.perf_counter() - self.started
+            metrics.observe(f"{self.name}.ttft", self.ttft)
+
+    def finish(self, error: Optional[BaseException] = None):
+        self.duration = time.perf_counter() - self.started
+        if error is not None:
+            self.error = type(error).__name__
+        if self.parent is not None:
+            with self.parent._children_lock:
+                self.parent._children.append((self.started, self.started + self.duration))
+        metrics.observe(f"{self.name}.duration", self.duration)
+        with _lock:
+            _finished.append(self)
+
+    @property
+    def child_time(self) -> float:
+        """Time within this span covered by at least one finished child"""
+        end = self.started + (self.duration or 0.0)
+        with self._children_lock:
+            intervals = sorted(self._children)
+        covered, reached = 0.0, self.started
+        for child_start, child_end in intervals:
+            child_start, child_end = max(child_start, reached), min(child_end, end)
+            if child_end > child_start:
+                covered += child_end - child_start
+                reached = child_end
+        return covered
+
+    @property
+    def self_time(self) -> float:
+        return max(0.0, (self.duration or 0.0) - self.child_time)
+
+    def to_event(self) -> dict:
+        """Chrome trace event ("complete" phase) for chrome://tracing or Perfetto"""
+        args = {
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "self_time_ms": round(self.self_time * 1000, 3),
+            "retries": self.retries,
+            **self.attributes,
+        }
+        if self.ttft is not None:
+            args["ttft_ms"] = round(self.ttft * 1000, 3)
+        if self.cache is not None:
+            args["cache"] = self.cache
+        if self.error is not None:
+            args["error"] = self.error
+        return {
+            "name": self.name,
+            "ph": "X",
+            "ts": int((_EPOCH + self.started) * 1_000_000),
+            "dur": int(self.duration * 1_000_000),
+            "pid": os.getpid(),
+            "tid": self.thread_id,
+            "args": args,
+        }
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+def annotate(**attributes):
+    """Set attributes on the current span, if there is one.
+
+    ``cache`` and ``retries`` update the span's dedicated fields.
+    """
+    current = _current.get()
+    if current is None:
+        return
+    if "cache" in attributes:
+        current.cache = attributes.pop("cache")
+    if "retries" in attributes:
+        current.retries += attributes.pop("retries")
+    current.attributes.update(attributes)
+
+
+def _trace_iter(span: Span, iterator: Iterator) -> Iterator:
+    # The span is current only while the wrapped iterator runs, never
+    # while the consumer holds control between items
+    error = None
+    try:
+        while True:
+            token = _current.set(span)
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                _current.reset(token)
+            if getattr(item, "content", item):
+                span.first_token()
+            yield item
+    except BaseException as exc:
+        error = exc
+        raise
+    finally:
+        close = getattr(iterator, "close", None)
+        if close is not None:
+            close()
+        span.finish(None if isinstance(error, GeneratorExit) else error)
+
+
+async def _atrace_iter(span: Span, iterator: AsyncIterator) -> AsyncIterator:
+    error = None
+    try:
+        while True:
+            token = _current.set(span)
+            try:
+                item = await iterator.__anext__()
+            except StopAsyncIteration:
+                return
+            finally:
+                _current.reset(token)
+            if getattr(item, "content", item):
+                span.first_token()
+            yield item
+    except BaseException as exc:
+        error = exc
+        raise
+    finally:
+        aclose = getattr(iterator, "aclose", None)
+        if aclose is not None:
+            await aclose()
+        span.finish(None if isinstance(error, GeneratorExit) else error)
+
+
+def trace_stream(name: str, iterator: Iterator, **attributes) -> Iterator:
+    """Wrap a stream in a span that ends when the stream does; records TTFT"""
+    if not config.TRACING:
+        return iterator
+    return _trace_iter(Span(name, _current.get(), attributes), iterator)
+
+
+def atrace_stream(name: str, iterator: AsyncIterator, **attributes) -> AsyncIterator:
+    """Async counterpart of :func:`trace_stream`"""
+    if not config.TRACING:
+        return iterator
+    return _atrace_iter(Span(name, _current.get(), attributes), iterator)
+
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[Optional[Span]]:
+    """Time a block as a span nested under the current one"""
+    if not config.TRACING:
+        yield None
+        return
+    current = Span(name, _current.get(), attributes)
+    token = _current.set(current)
+    error = None
+    try:
+        yield current
+    except BaseException as exc:
+        error = exc
+        raise
+    finally:
+        _current.reset(token)
+        current.finish(error)
+
+
+def traced(name: str) -> Callable:
+    """Decorator wrapping a function, coroutine function or generator in a span"""
+    def decorate(func: Callable) -> Callable:
+        if inspect.isasyncgenfunction(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                return atrace_stream(name, func(*args, **kwargs))
+        elif inspect.isgeneratorfunction(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                return trace_stream(name, func(*args, **kwargs))
+        elif inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                with span(name):
+                    return await func(*args, **kwargs)
+        else:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with span(name):
+                    return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def trace_events() -> dict:
+    """Recent finished spans in the Chrome trace JSON format"""
+    with _lock:
+        events = [finished.to_event() for finished in _finished]
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+def dump_trace(path: Optional[str] = None) -> str:
+    """Write :func:`trace_events` to ``path`` (default TRACE_DUMP_PATH) and return the path"""
+    path = path or config.TRACE_DUMP_PATH
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as handle:
+        json.dump(trace_events(), handle)
+    return path
@@ -1,24 +1,56 @@
-import os
-from typing import TypedDict, Annotated, List, Optional
-from langchain_groq import ChatGroq
+import asyncio
+from typing import TypedDict, Annotated, Awaitable, Dict, List, Optional, Tuple
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.messages import HumanMessage, AIMessage
 import gradio as gr
 from dotenv import load_dotenv
 import random
+import time
+import config
+from streaming import astream_chat, stream_chat
+from response_cache import ResponseCache, get_response_cache
+from session_history import SessionHistory
+from llm_provider import ainvoke_llm, get_llm, invoke_llm
+from model_router import route_for
+from tracing import traced
+from usage_ledger import TokenBudgetExceeded, usage_scope
+from request_keys import canonical_city, canonical_itinerary_vars, city_cache_key, itinerary_cache_key
 
 load_dotenv()
 
+# Shown in place of a section that failed or did not finish in time
+SECTION_FALLBACKS = {
+    "alternatives": "⚠️ Alternative plans are unavailable right now. Please try again later.",
+    "local_tips": "⚠️ Local insider tips are unavailable right now. Please try again later.",
+    "safety_info": "⚠️ Safety information is unavailable right now. Please try again later.",
+}
+
+# Shown while a section is still being generated
+SECTION_PLACEHOLDERS = {
+    "alternatives": "⏳ Crafting alternative plans...",
+    "local_tips": "⏳ Gathering local insider tips...",
+    "safety_info": "⏳ Compiling safety information...",
+}
+
+# Shown in a collapsed section until it is opened for the current itinerary
+SECTION_HINTS = {
+    "alternatives": "🔄 Open this section to generate alternative plans.",
+    "local_tips": "🗝 Open this section to get local insider tips.",
+    "safety_info": "🛡 Open this section to get safety information.",
+}
+
 class TravelPlanner:
     def __init__(self):
-        self.llm = ChatGroq(
-            temperature=0.1,
-            groq_api_key=os.getenv("GROQ_API_KEY"),
-            model_name="llama-3.3-70b-versatile"
-        )
-        self.session_history = []
+        # Few slots so prefetching never competes with on-demand sections
+        self._prefetch_slots = asyncio.Semaphore(config.PREFETCH_CONCURRENCY)
+        self._prefetch_tasks = set()
         self._setup_prompts()
     
+    @property
+    def llm(self):
+        """Chat model shared with the CLI workflow"""
+        return get_llm()
+    
     def _setup_prompts(self):
         """Initialize all prompt templates"""
         self.itinerary_prompt = ChatPromptTemplate.from_messages([
@@ -49,10 +81,88 @@ class TravelPlanner:
             ("human", "What should I know about safety?"),
         ])
     
+    async def _ainvoke_text(self, messages, section: str) -> str:
+        """Text of an async scheduled model call"""
+        return (await ainvoke_llm(messages, section)).content
+    
+    @traced("planner.generate_itinerary")
     def generate_itinerary(self, city: str, interests: str, budget: str = "mid-range", 
                           duration: str = "3 days", travel_style: str = "adventurous"):
         """Generate main travel itinerary"""
-        prompt_vars = {
+        prompt_vars = self._itinerary_vars(city, interests, budget, duration, travel_style)
+        return get_response_cache().get_or_create(
+            itinerary_cache_key(prompt_vars),
+            lambda: invoke_llm(self.itinerary_prompt.format_messages(**prompt_vars), "itinerary").content
+        )
+    
+    @traced("planner.agenerate_itinerary")
+    async def agenerate_itinerary(self, city: str, interests: str, budget: str = "mid-range",
+                                  duration: str = "3 days", travel_style: str = "adventurous"):
+        """Async counterpart of :meth:`generate_itinerary`"""
+        prompt_vars = self._itinerary_vars(city, interests, budget, duration, travel_style)
+        return await get_response_cache().aget_or_create(
+            itinerary_cache_key(prompt_vars),
+            lambda: self._ainvoke_text(self.itinerary_prompt.format_messages(**prompt_vars), "itinerary")
+        )
+    
+    @traced("planner.stream_itinerary")
+    def stream_itinerary(self, city: str, interests: str, budget: str = "mid-range",
+                         duration: str = "3 days", travel_style: str = "adventurous"):
+        """Stream the main itinerary, yielding the text generated so far.
+
+        Yields at most once per ``STREAM_UPDATE_INTERVAL_SECONDS``, and always
+        the complete text last.
+        """
+        prompt_vars = self._itinerary_vars(city, interests, budget, duration, travel_style)
+        cache = get_response_cache()
+        key = itinerary_cache_key(prompt_vars)
+        
+        cached = cache.get(key)
+        if cached is not None:
+            yield cached
+            return
+        
+        # Updates are throttled: each one carries the whole text so far
+        parts, last_update, fallbacks = [], 0.0, []
+        for token in stream_chat(self.itinerary_prompt.format_messages(**prompt_vars), "itinerary", fallbacks):
+            parts.append(token)
+            now = time.monotonic()
+            if now - last_update >= config.STREAM_UPDATE_INTERVAL_SECONDS:
+                last_update = now
+                yield "".join(parts)
+        text = "".join(parts)
+        if not fallbacks:
+            cache.set(key, text)
+        yield text
+    
+    @traced("planner.astream_itinerary")
+    async def astream_itinerary(self, city: str, interests: str, budget: str = "mid-range",
+                                duration: str = "3 days", travel_style: str = "adventurous"):
+        """Async counterpart of :meth:`stream_itinerary`"""
+        prompt_vars = self._itinerary_vars(city, interests, budget, duration, travel_style)
+        cache = get_response_cache()
+        key = itinerary_cache_key(prompt_vars)
+        
+        cached = cache.get(key)
+        if cached is not None:
+            yield cached
+            return
+        
+        parts, last_update, fallbacks = [], 0.0, []
+        async for token in astream_chat(self.itinerary_prompt.format_messages(**prompt_vars), "itinerary", fallbacks):
+            parts.append(token)
+            now = time.monotonic()
+            if now - last_update >= config.STREAM_UPDATE_INTERVAL_SECONDS:
+                last_update = now
+                yield "".join(parts)
+        text = "".join(parts)
+        if not fallbacks:
+            cache.set(key, text)
+        yield text
+    
+    def _itinerary_vars(self, city: str, interests: str, budget: str, duration: str, travel_style: str):
+        """Canonical itinerary prompt variables for the web interface"""
+        return canonical_itinerary_vars({
             "city": city,
             "interests": interests,
             "budget": budget,
@@ -62,30 +172,105 @@ class TravelPlanner:
             "accommodation_type": "hotel",
             "transportation": "mixed",
             "dietary_restrictions": "none"
-        }
-        
-        response = self.llm.invoke(self.itinerary_prompt.format_messages(**prompt_vars))
-        return response.content
+        })
     
-    def generate_alternative_plans(self, city: str, interests: str, duration: str, travel_style: str):
-        """Generate alternative travel plans"""
+    def _alternatives_request(self, city: str, interests: str, duration: str, travel_style: str) -> Tuple[str, list]:
+        """Cache key and prompt messages for the alternative plans section"""
+        prompt_vars = self._itinerary_vars(city, interests, "mid-range", duration, travel_style)
         alt_prompt = ChatPromptTemplate.from_messages([
-            ("system", f"Create 2 alternative {duration} itineraries for {city} with different themes. "
-                      f"One budget-focused, one luxury-focused. Consider {interests} and {travel_style} style."),
+            ("system", f"Create 2 alternative {prompt_vars['duration']} itineraries for {prompt_vars['city']} "
+                      f"with different themes. One budget-focused, one luxury-focused. "
+                      f"Consider {prompt_vars['interests']} and {prompt_vars['travel_style']} style."),
             ("human", "Create alternative plans."),
         ])
-        response = self.llm.invoke(alt_prompt.format_messages())
-        return response.content
+        key = ResponseCache.make_key(
+            "alternatives",
+            model=route_for("alternatives").models[0],
+            **{k: prompt_vars[k] for k in ("city", "interests", "duration", "travel_style")}
+        )
+        return key, alt_prompt.format_messages()
+    
+    @traced("planner.generate_alternative_plans")
+    def generate_alternative_plans(self, city: str, interests: str, duration: str, travel_style: str):
+        """Generate alternative travel plans"""
+        key, messages = self._alternatives_request(city, interests, duration, travel_style)
+        return get_response_cache().get_or_create(
+            key, lambda: invoke_llm(messages, "alternatives").content
+        )
+    
+    @traced("planner.agenerate_alternative_plans")
+    async def agenerate_alternative_plans(self, city: str, interests: str, duration: str, travel_style: str):
+        """Async counterpart of :meth:`generate_alternative_plans`"""
+        key, messages = self._alternatives_request(city, interests, duration, travel_style)
+        return await get_response_cache().aget_or_create(
+            key, lambda: self._ainvoke_text(messages, "alternatives")
+        )
     
+    @traced("planner.generate_local_tips")
     def generate_local_tips(self, city: str):
         """Generate local insider tips"""
-        response = self.llm.invoke(self.local_tips_prompt.format_messages(city=city))
-        return response.content
+        city = canonical_city(city)
+        return get_response_cache().get_or_create(
+            city_cache_key("local_tips", city),
+            lambda: invoke_llm(self.local_tips_prompt.format_messages(city=city), "local_tips").content
+        )
+    
+    @traced("planner.agenerate_local_tips")
+    async def agenerate_local_tips(self, city: str):
+        """Async counterpart of :meth:`generate_local_tips`"""
+        city = canonical_city(city)
+        return await get_response_cache().aget_or_create(
+            city_cache_key("local_tips", city),
+            lambda: self._ainvoke_text(self.local_tips_prompt.format_messages(city=city), "local_tips")
+        )
     
+    @traced("planner.generate_safety_info")
     def generate_safety_info(self, city: str):
         """Generate safety information"""
-        response = self.llm.invoke(self.safety_prompt.format_messages(city=city))
-        return response.content
+        city = canonical_city(city)
+        return get_response_cache().get_or_create(
+            city_cache_key("safety_info", city),
+            lambda: invoke_llm(self.safety_prompt.format_messages(city=city), "safety_info").content
+        )
+    
+    @traced("planner.agenerate_safety_info")
+    async def agenerate_safety_info(self, city: str):
+        """Async counterpart of :meth:`generate_safety_info`"""
+        city = canonical_city(city)
+        return await get_response_cache().aget_or_create(
+            city_cache_key("safety_info", city),
+            lambda: self._ainvoke_text(self.safety_prompt.format_messages(city=city), "safety_info")
+        )
+    
+    def _section_coroutine(self, name: str, trip: Dict[str, str]) -> Awaitable[str]:
+        """Coroutine that generates one secondary section for a trip"""
+        if name == "alternatives":
+            return self.agenerate_alternative_plans(
+                trip["city"], trip["interests"], trip["duration"], trip["travel_style"]
+            )
+        if name == "local_tips":
+            return self.agenerate_local_tips(trip["city"])
+        return self.agenerate_safety_info(trip["city"])
+    
+    async def load_section(self, name: str, trip: Dict[str, str]) -> Optional[str]:
+        """Generate a section on demand, or return None if it failed or timed out"""
+        try:
+            return await asyncio.wait_for(
+                self._section_coroutine(name, trip), timeout=config.SECTION_TIMEOUT_SECONDS
+            )
+        except Exception:
+            return None
+    
+    async def _prefetch_section(self, name: str, trip: Dict[str, str]):
+        async with self._prefetch_slots:
+            await self.load_section(name, trip)
+    
+    def prefetch_sections(self, trip: Dict[str, str]):
+        """Warm the response cache for every section in the background"""
+        for name in SECTION_HINTS:
+            task = asyncio.get_running_loop().create_task(self._prefetch_section(name, trip))
+            self._prefetch_tasks.add(task)
+            task.add_done_callback(self._prefetch_tasks.discard)
     
     def get_dynamic_suggestion(self, city: str, interests: str):
         """Get a single dynamic suggestion for follow-up"""
@@ -173,70 +358,131 @@ class TravelPlanner:
                     
                     follow_btn = gr.Button("💡 Get Additional Suggestion", size="sm")
                     
-                    with gr.Accordion("🔄 Alternative Plans", open=False):
+                    with gr.Accordion("🔄 Alternative Plans", open=False) as alt_accordion:
                         alt_plans = gr.Markdown("Generate an itinerary to see alternative options!")
                     
-                    with gr.Accordion("🗝 Local Insider Tips", open=False):
+                    with gr.Accordion("🗝 Local Insider Tips", open=False) as tips_accordion:
                         local_tips = gr.Markdown("Generate an itinerary to get local insights!")
                     
-                    with gr.Accordion("🛡 Safety & Travel Info", open=False):
+                    with gr.Accordion("🛡 Safety & Travel Info", open=False) as safety_accordion:
                         safety_info = gr.Markdown("Generate an itinerary for safety information!")
                     
                     with gr.Accordion("🕓 Session History", open=False):
                         session_list = gr.Markdown("Your travel planning history will appear here...")
+                        # Compacted entries show a preview; their full text is opened by id
+                        with gr.Row(visible=bool(config.HISTORY_COMPACT_CHARS)):
+                            stored_id = gr.Textbox(label="🔎 Stored itinerary id", placeholder="e.g. 3f2a9c1b7d4e", scale=3)
+                            show_stored_btn = gr.Button("📖 Show Full Itinerary", size="sm", scale=1)
+                        stored_itinerary = gr.Markdown()
 
             # Initialize state variables with default values
             itinerary_state = gr.State("")
             city_state = gr.State("")
             interests_state = gr.State("")
             suggestion_state = gr.State("")
+            history_state = gr.State(SessionHistory)
+            # Inputs of the current itinerary, and the sections generated for it so far
+            trip_state = gr.State({})
+            sections_state = gr.State({})
 
-            def enhanced_itinerary_generation(city, interests, budget, duration, travel_style):
+            section_outputs = {"alternatives": alt_plans, "local_tips": local_tips, "safety_info": safety_info}
+            section_accordions = {
+                "alternatives": alt_accordion,
+                "local_tips": tips_accordion,
+                "safety_info": safety_accordion,
+            }
+
+            async def enhanced_itinerary_generation(city, interests, budget, duration, travel_style, history,
+                                                    request: gr.Request):
                 if not city or not interests:
                     raise gr.Error("Please enter both city and interests to generate an itinerary")
                 
-                # Generate main itinerary
-                main_itinerary = self.generate_itinerary(city, interests, budget, duration, travel_style)
-                result = f"### ✨ Your Chaotic Adventure in {city.title()}\n\n{main_itinerary}"
+                # Secondary sections are generated when their accordion is opened
+                trip = {
+                    "city": city,
+                    "interests": interests,
+                    "duration": duration,
+                    "travel_style": travel_style,
+                }
+                header = f"### ✨ Your Chaotic Adventure in {city.title()}\n\n"
+                yield {
+                    output: header,
+                    trip_state: trip,
+                    sections_state: {},
+                    **{section_outputs[name]: hint for name, hint in SECTION_HINTS.items()},
+                    **{accordion: gr.update(open=False) for accordion in section_accordions.values()}
+                }
+
+                result = header
+                # Token usage is attributed to this browser session
+                with usage_scope(request.session_hash):
+                    try:
+                        if config.STREAM_ITINERARY:
+                            async for partial in self.astream_itinerary(city, interests, budget, duration, travel_style):
+                                result = header + partial
+                                yield {output: result}
+                        else:
+                            result = header + await self.agenerate_itinerary(city, interests, budget, duration, travel_style)
+                            yield {output: result}
+                    except TokenBudgetExceeded as e:
+                        raise gr.Error(str(e))
+                    except Exception as e:
+                        raise gr.Error(f"Could not generate your itinerary: {e}")
+                    
+                    if config.PREFETCH_SECTIONS:
+                        self.prefetch_sections(trip)
                 
                 # Store in session history
-                self.session_history.append((city, interests, result))
-                
-                # Generate additional content
-                alt_content = self.generate_alternative_plans(city, interests, duration, travel_style)
-                tips_content = self.generate_local_tips(city)
-                safety_content = self.generate_safety_info(city)
+                history_md = history.add(city, interests, result)
                 
                 # Get dynamic suggestion
                 suggestion = self.get_dynamic_suggestion(city, interests)
                 
-                # Create history markdown
-                history_md = "\n\n---\n\n".join(
-                    [f"**City:** {c}\n**Interests:** {i}\n{r}" for c, i, r in reversed(self.session_history)]
-                ) if self.session_history else "No history yet"
-                
-                return (
-                    result,  # main itinerary
-                    suggestion,  # follow-up suggestion
-                    alt_content,  # alternative plans
-                    tips_content,  # local tips
-                    safety_content,  # safety info
-                    history_md,  # history
-                    result,  # itinerary state
-                    city,  # city state
-                    interests,  # interests state
-                    suggestion  # suggestion state
-                )
+                # Publish the finished itinerary and follow-up state
+                yield {
+                    output: result,
+                    follow_btn: suggestion,
+                    session_list: history_md,
+                    history_state: history,
+                    itinerary_state: result,
+                    city_state: city,
+                    interests_state: interests,
+                    suggestion_state: suggestion
+                }
+
+            def section_loader(name):
+                async def load_section(trip, sections, request: gr.Request):
+                    """Generate a section the first time it is opened, then reuse it"""
+                    if not trip:
+                        yield gr.update(), sections
+                        return
+                    if name in sections:
+                        yield sections[name], sections
+                        return
+                    yield SECTION_PLACEHOLDERS[name], sections
+                    with usage_scope(request.session_hash):
+                        text = await self.load_section(name, trip)
+                    if text is None:
+                        yield SECTION_FALLBACKS[name], sections
+                    else:
+                        yield text, {**sections, name: text}
+                return load_section
 
-            def handle_suggestion_click(suggestion, itinerary, city, interests):
+            async def handle_suggestion_click(suggestion, itinerary, city, interests):
                 if not suggestion:
                     return itinerary
                 return self.handle_follow_up(suggestion, itinerary, city, interests)
 
+            def show_stored_itinerary(digest, history):
+                try:
+                    return history.body(digest.strip().strip("`"))
+                except KeyError:
+                    raise gr.Error("No stored itinerary with that id in this session's history")
+
             # Main submission
             submit_btn.click(
                 fn=enhanced_itinerary_generation,
-                inputs=[city, interests, budget, duration, travel_style],
+                inputs=[city, interests, budget, duration, travel_style, history_state],
                 outputs=[
                     output,
                     follow_btn,
@@ -247,15 +493,46 @@ class TravelPlanner:
                     itinerary_state,
                     city_state,
                     interests_state,
-                    suggestion_state
-                ]
+                    suggestion_state,
+                    trip_state,
+                    sections_state,
+                    history_state,
+                    alt_accordion,
+                    tips_accordion,
+                    safety_accordion
+                ],
+                api_name="plan"
             )
 
+            # Secondary sections load lazily, memoized per session
+            for name, accordion in section_accordions.items():
+                accordion.expand(
+                    fn=section_loader(name),
+                    inputs=[trip_state, sections_state],
+                    outputs=[section_outputs[name], sections_state],
+                    api_name=f"load_{name}"
+                )
+
             # Follow-up button
             follow_btn.click(
                 fn=handle_suggestion_click,
                 inputs=[suggestion_state, itinerary_state, city_state, interests_state],
-                outputs=output
+                outputs=output,
+                api_name="follow_up"
+            )
+
+            # Full text of a compacted history entry
+            show_stored_btn.click(
+                fn=show_stored_itinerary,
+                inputs=[stored_id, history_state],
+                outputs=stored_itinerary,
+                api_name="history_entry"
             )
         
+        # Async handlers hold no worker thread while waiting on Groq, so the
+        # queue can admit many concurrent planning requests
+        demo.queue(
+            default_concurrency_limit=config.GRADIO_CONCURRENCY_LIMIT,
+            max_size=config.GRADIO_QUEUE_MAX_SIZE
+        )
         return demo
\ No newline at end of file
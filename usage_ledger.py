@@ -0,0 +1,173 @@
+import contextvars
+import json
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+import config
+
+_session: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("usage_session", default=None)
+_request: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("usage_request", default=None)
+
+
+class TokenBudgetExceeded(Exception):
+    """Raised before an LLM call once a session has used up SESSION_TOKEN_BUDGET"""
+
+
+def _totals() -> Dict[str, float]:
+    return {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0}
+
+
+def _add(totals: Dict[str, float], prompt_tokens: int, completion_tokens: int, cost: float):
+    totals["calls"] += 1
+    totals["prompt_tokens"] += prompt_tokens
+    totals["completion_tokens"] += completion_tokens
+    totals["cost_usd"] += cost
+
+
+def _used(totals: Optional[Dict[str, float]]) -> int:
+    return int(totals["prompt_tokens"] + totals["completion_tokens"]) if totals else 0
+
+
+@contextmanager
+def usage_scope(session_id: str, request_id: Optional[str] = None) -> Iterator[str]:
+    """Attribute LLM usage inside the block to ``session_id`` and one request id.
+
+    The previous scope is restored by value rather than by token, so the
+    block may span an async generator's yields.
+    """
+    previous = (_session.get(), _request.get())
+    request_id = request_id or uuid.uuid4().hex[:12]
+    _session.set(session_id)
+    _request.set(request_id)
+    try:
+        yield request_id
+    finally:
+        _session.set(previous[0])
+        _request.set(previous[1])
+
+
+def cost_of(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    """Estimated USD cost from LLM_PRICES (per million input/output tokens)"""
+    input_price, output_price = config.LLM_PRICES.get(model, (0.0, 0.0))
+    return (prompt_tokens * input_price + completion_tokens * output_price) / 1_000_000
+
+
+class UsageLedger:
+    """Prompt and completion tokens per section, model, request and session.
+
+    Only the most recent ``max_sessions`` sessions and ``max_requests``
+    requests are kept individually; the section and model totals cover the
+    whole process lifetime.
+    """
+
+    def __init__(self, session_budget: int, max_sessions: int, max_requests: int):
+        self.session_budget = session_budget
+        self.max_sessions = max_sessions
+        self.max_requests = max_requests
+        self.total = _totals()
+        self.by_section: Dict[str, Dict[str, float]] = {}
+        self.by_model: Dict[str, Dict[str, float]] = {}
+        self.sessions: OrderedDict = OrderedDict()
+        self.requests: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _bounded(table: OrderedDict, key: str, limit: int) -> Dict[str, float]:
+        totals = table.get(key)
+        if totals is None:
+            totals = table[key] = _totals()
+            while len(table) > limit:
+                table.popitem(last=False)
+        else:
+            table.move_to_end(key)
+        return totals
+
+    def record(self, section: str, model: str, usage: Optional[dict]):
+        """Add one call's ``usage_metadata`` to the current session and request"""
+        if not usage:
+            return
+        prompt_tokens = int(usage.get("input_tokens", 0))
+        completion_tokens = int(usage.get("output_tokens", 0))
+        cost = cost_of(model, prompt_tokens, completion_tokens)
+        session, request = _session.get(), _request.get()
+        with self._lock:
+            tables = [
+                self.total,
+                self.by_section.setdefault(section, _totals()),
+                self.by_model.setdefault(model, _totals()),
+            ]
+            if session is not None:
+                tables.append(self._bounded(self.sessions, session, self.max_sessions))
+            if request is not None:
+                tables.append(self._bounded(self.requests, request, self.max_requests))
+            for totals in tables:
+                _add(totals, prompt_tokens, completion_tokens, cost)
+
+    def session_usage(self, session: Optional[str] = None) -> Dict[str, float]:
+        """Totals for ``session`` (default: the current one)"""
+        session = session or _session.get()
+        with self._lock:
+            return dict(self.sessions.get(session) or _totals())
+
+    def request_usage(self, request_id: str) -> Dict[str, float]:
+        """Totals for one request, as returned by :func:`usage_scope`"""
+        with self._lock:
+            return dict(self.requests.get(request_id) or _totals())
+
+    def remaining(self, session: Optional[str] = None) -> Optional[int]:
+        """Tokens left in the session's budget, or None if budgets are off"""
+        if not self.session_budget:
+            return None
+        session = session or _session.get()
+        if session is None:
+            return None
+        with self._lock:
+            used = _used(self.sessions.get(session))
+        return max(0, self.session_budget - used)
+
+    def check_budget(self):
+        """Raise :class:`TokenBudgetExceeded` if the current session has no tokens left"""
+        if self.remaining() == 0:
+            raise TokenBudgetExceeded(
+                f"This session has used its budget of {self.session_budget} tokens"
+            )
+
+    def snapshot(self) -> dict:
+        """Aggregates for capacity planning"""
+        with self._lock:
+            return {
+                "total": dict(self.total),
+                "by_section": {name: dict(totals) for name, totals in self.by_section.items()},
+                "by_model": {name: dict(totals) for name, totals in self.by_model.items()},
+                "sessions": {name: dict(totals) for name, totals in self.sessions.items()},
+            }
+
+    def gauges(self) -> Dict[str, float]:
+        """Token counters per section and model, for the metrics endpoint"""
+        snapshot = self.snapshot()
+        gauges = {"llm_cost_usd_total": snapshot["total"]["cost_usd"]}
+        for kind in ("by_section", "by_model"):
+            for name, totals in snapshot[kind].items():
+                label = "".join(c if c.isalnum() else "_" for c in name)
+                gauges[f"llm_prompt_tokens_{label}_total"] = totals["prompt_tokens"]
+                gauges[f"llm_completion_tokens_{label}_total"] = totals["completion_tokens"]
+        return gauges
+
+    def export(self, path: Optional[str] = None) -> str:
+        """Write :meth:`snapshot` as JSON to ``path`` (default USAGE_EXPORT_PATH) and return the path"""
+        path = path or config.USAGE_EXPORT_PATH
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as handle:
+            json.dump(self.snapshot(), handle, indent=2)
+        return path
+
+
+ledger = UsageLedger(
+    session_budget=config.SESSION_TOKEN_BUDGET,
+    max_sessions=config.USAGE_MAX_SESSIONS,
+    max_requests=config.USAGE_MAX_SESSIONS * 10,
+)
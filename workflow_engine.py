@@ -1,13 +1,28 @@
 from langgraph.graph import StateGraph, END
 from state_definitions import PlannerState
+from tracing import traced
+from recompute_planner import stale_sections
 from workflow_nodes import (
     input_city, input_interests, input_budget, input_duration,
     input_travel_style, input_group_details, input_accommodation,
     input_transportation, input_dietary_restrictions, create_main_itinerary,
     generate_recommendations, generate_local_tips, generate_safety_info,
-    create_alternative_plans, check_satisfaction, refine_itinerary, finalize_plan
+    create_alternative_plans, check_satisfaction, refine_itinerary, compact_context,
+    finalize_plan
 )
 
+# Independent sections generated concurrently after the main itinerary
+PARALLEL_BRANCHES = [
+    "generate_recommendations",
+    "generate_local_tips",
+    "generate_safety_info",
+    "create_alternative_plans",
+]
+
+def _add_node(workflow: StateGraph, name: str, node):
+    """Register a node wrapped in a ``node.<name>`` tracing span"""
+    workflow.add_node(name, traced(f"node.{name}")(node))
+
 def should_refine(state: PlannerState) -> str:
     """Conditional routing for refinement or finalization"""
     if state.get("refinement_requested", False):
@@ -17,28 +32,52 @@ def should_refine(state: PlannerState) -> str:
     else:
         return "finalize_plan"  # Default to finalization
 
-def create_workflow():
-    """Create and compile the LangGraph workflow"""
+def plan_recompute(state: PlannerState) -> list:
+    """After a refinement, re-run only the sections whose inputs changed"""
+    return stale_sections(state, PARALLEL_BRANCHES) or ["check_satisfaction"]
+
+def create_workflow(interactive: bool = True, checkpointer=None):
+    """Create and compile the LangGraph workflow.
+
+    With ``interactive=False`` the graph starts at ``create_main_itinerary``
+    from a pre-filled state and ends once the parallel sections are done, so
+    it never blocks on ``input()``. A ``checkpointer`` persists state after
+    every step so a run can be resumed by its ``thread_id``.
+    """
     workflow = StateGraph(PlannerState)
 
-    # Add all nodes
-    workflow.add_node("input_city", input_city)
-    workflow.add_node("input_interests", input_interests)
-    workflow.add_node("input_budget", input_budget)
-    workflow.add_node("input_duration", input_duration)
-    workflow.add_node("input_travel_style", input_travel_style)
-    workflow.add_node("input_group_details", input_group_details)
-    workflow.add_node("input_accommodation", input_accommodation)
-    workflow.add_node("input_transportation", input_transportation)
-    workflow.add_node("input_dietary_restrictions", input_dietary_restrictions)
-    workflow.add_node("create_main_itinerary", create_main_itinerary)
-    workflow.add_node("generate_recommendations", generate_recommendations)
-    workflow.add_node("generate_local_tips", generate_local_tips)
-    workflow.add_node("generate_safety_info", generate_safety_info)
-    workflow.add_node("create_alternative_plans", create_alternative_plans)
-    workflow.add_node("check_satisfaction", check_satisfaction)
-    workflow.add_node("refine_itinerary", refine_itinerary)
-    workflow.add_node("finalize_plan", finalize_plan)
+    # Generation nodes shared by both modes
+    _add_node(workflow, "create_main_itinerary", create_main_itinerary)
+    _add_node(workflow, "generate_recommendations", generate_recommendations)
+    _add_node(workflow, "generate_local_tips", generate_local_tips)
+    _add_node(workflow, "generate_safety_info", generate_safety_info)
+    _add_node(workflow, "create_alternative_plans", create_alternative_plans)
+
+    # Parallel processing of additional information: the branches run in one
+    # super-step and the next node only starts once all of them finish
+    join = "check_satisfaction" if interactive else END
+    for branch in PARALLEL_BRANCHES:
+        workflow.add_edge("create_main_itinerary", branch)
+        workflow.add_edge(branch, join)
+
+    if not interactive:
+        workflow.set_entry_point("create_main_itinerary")
+        return workflow.compile(checkpointer=checkpointer)
+
+    # Interactive nodes
+    _add_node(workflow, "input_city", input_city)
+    _add_node(workflow, "input_interests", input_interests)
+    _add_node(workflow, "input_budget", input_budget)
+    _add_node(workflow, "input_duration", input_duration)
+    _add_node(workflow, "input_travel_style", input_travel_style)
+    _add_node(workflow, "input_group_details", input_group_details)
+    _add_node(workflow, "input_accommodation", input_accommodation)
+    _add_node(workflow, "input_transportation", input_transportation)
+    _add_node(workflow, "input_dietary_restrictions", input_dietary_restrictions)
+    _add_node(workflow, "check_satisfaction", check_satisfaction)
+    _add_node(workflow, "refine_itinerary", refine_itinerary)
+    _add_node(workflow, "compact_context", compact_context)
+    _add_node(workflow, "finalize_plan", finalize_plan)
 
     # Set entry point
     workflow.set_entry_point("input_city")
@@ -56,14 +95,7 @@ def create_workflow():
     # Main itinerary creation
     workflow.add_edge("input_dietary_restrictions", "create_main_itinerary")
 
-    # Parallel processing of additional information
-    workflow.add_edge("create_main_itinerary", "generate_recommendations")
-    workflow.add_edge("generate_recommendations", "generate_local_tips")
-    workflow.add_edge("generate_local_tips", "generate_safety_info")
-    workflow.add_edge("generate_safety_info", "create_alternative_plans")
-
     # Satisfaction check and refinement loop
-    workflow.add_edge("create_alternative_plans", "check_satisfaction")
     workflow.add_conditional_edges(
         "check_satisfaction",
         should_refine,
@@ -73,9 +105,15 @@ def create_workflow():
         }
     )
 
-    # Refinement loop
-    workflow.add_edge("refine_itinerary", "check_satisfaction")
+    # Refinement loop: the conversation is compacted, then stale sections are
+    # regenerated in parallel and the rest are kept
+    workflow.add_edge("refine_itinerary", "compact_context")
+    workflow.add_conditional_edges(
+        "compact_context",
+        plan_recompute,
+        PARALLEL_BRANCHES + ["check_satisfaction"]
+    )
     workflow.add_edge("finalize_plan", END)
 
     # Compile the workflow
-    return workflow.compile()
\ No newline at end of file
+    return workflow.compile(checkpointer=checkpointer)
\ No newline at end of file
@@ -1,15 +1,16 @@
-import os
-from langchain_groq import ChatGroq
 from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import RunnableLambda
 from langchain_core.messages import HumanMessage, AIMessage
 from state_definitions import PlannerState
-
-# Initialize AI Model
-llm = ChatGroq(
-    temperature=0.1,
-    groq_api_key=os.getenv("GROQ_API_KEY"),
-    model_name="llama-3.3-70b-versatile"
-)
+from response_cache import get_response_cache, producing, skip_store
+from request_keys import canonical_city, canonical_itinerary_vars, city_cache_key, itinerary_cache_key
+from streaming import stream_chat
+from llm_provider import invoke_llm
+from recompute_planner import input_fingerprint, is_stale
+from itinerary_sections import parse_itinerary, requested_days
+from context_compaction import ITINERARY_MESSAGE, ReplaceMessages, compact_messages, estimate_tokens
+from usage_ledger import ledger
+import config
 
 # Prompt Templates
 itinerary_prompt = ChatPromptTemplate.from_messages([
@@ -40,199 +41,278 @@ safety_prompt = ChatPromptTemplate.from_messages([
     ("human", "What should I know about safety?"),
 ])
 
+alternative_prompt = ChatPromptTemplate.from_messages([
+    ("system", "Create a {style} alternative itinerary for {city} "
+               "based on {interests}. Make it distinct from mainstream tourism."),
+    ("human", "Create an alternative travel plan."),
+])
+
+day_refinement_prompt = ChatPromptTemplate.from_messages([
+    ("system", "You are ChaoticCompass, a wild and unpredictable travel assistant. "
+               "You are revising day {day} of a {duration} itinerary for {city}. "
+               "The other days stay exactly as they are:\n{context}\n"
+               "Rewrite only day {day} to satisfy the traveler's request, without repeating other days. "
+               "Start with a heading in the same style as: {heading}"),
+    ("human", "Current day {day}:\n{current}\n\nRequested change: {change}"),
+])
+
+def _console(*args, **kwargs):
+    """Print progress for interactive runs; silent in headless batch mode"""
+    if config.CONSOLE_OUTPUT:
+        print(*args, **kwargs)
+
+def _generate_to_console(messages, section: str) -> str:
+    """Print the model's reply as it streams in and return the full text"""
+    if not config.STREAM_ITINERARY or not config.CONSOLE_OUTPUT:
+        text = invoke_llm(messages, section).content
+        _console(text)
+        return text
+    
+    parts, fallbacks = [], []
+    for token in stream_chat(messages, section, fallbacks):
+        print(token, end="", flush=True)
+        parts.append(token)
+    print()
+    if fallbacks:
+        skip_store("fallback")
+    return "".join(parts)
+
+def _invoke_alternative(prompt_value):
+    """Scheduled model call for one alternative plan in a batch"""
+    return invoke_llm(prompt_value, "alternatives")
+
+def _invoke_day_refinement(prompt_value):
+    """Scheduled model call for one regenerated day in a batch"""
+    return invoke_llm(prompt_value, "refine")
+
+def _refine_days(state: PlannerState, days: list, change: str):
+    """Regenerate only the requested days and splice them into the itinerary.
+
+    Returns the updated itinerary, or None if the itinerary has none of the
+    requested days and must be regenerated as a whole.
+    """
+    document = parse_itinerary(state["itinerary"])
+    targets = [document.day(number) for number in days if document.day(number)]
+    if not targets:
+        return None
+    
+    responses = (day_refinement_prompt | RunnableLambda(_invoke_day_refinement)).batch(
+        [{
+            "day": day.number,
+            "duration": state.get("duration") or "multi-day",
+            "city": state["city"],
+            "context": document.context_for(day.number),
+            "heading": day.heading,
+            "current": day.text.strip(),
+            "change": change,
+        } for day in targets]
+    )
+    for day, response in zip(targets, responses):
+        document.replace_day(day.number, response.content)
+        _console(f"\n{response.content.strip()}")
+    return document.render()
+
 # Node Functions
 def input_city(state: PlannerState) -> PlannerState:
     print("🌍 Enter the city for your trip: ")
     city = input("Your Input: ")
     return {
-        **state, 
         "city": city, 
         "current_step": "city_selected",
-        "messages": state["messages"] + [HumanMessage(content=f"Selected city: {city}")]
+        "messages": [HumanMessage(content=f"Selected city: {city}")]
     }
 
 def input_interests(state: PlannerState) -> PlannerState:
     print(f"🎯 Enter your interests for {state['city']} (comma-separated): ")
     interests = input("Your Input: ").split(",")
     return {
-        **state, 
         "interests": [i.strip() for i in interests],
         "current_step": "interests_selected",
-        "messages": state["messages"] + [HumanMessage(content=f"Interests: {', '.join(interests)}")]
+        "messages": [HumanMessage(content=f"Interests: {', '.join(interests)}")]
     }
 
 def input_budget(state: PlannerState) -> PlannerState:
     print("💰 What's your budget range? (budget/mid-range/luxury)")
     budget = input("Your Input: ")
     return {
-        **state, 
         "budget": budget,
         "current_step": "budget_selected",
-        "messages": state["messages"] + [HumanMessage(content=f"Budget: {budget}")]
+        "messages": [HumanMessage(content=f"Budget: {budget}")]
     }
 
 def input_duration(state: PlannerState) -> PlannerState:
     print("📅 How long is your trip? (1 day/3 days/1 week/2 weeks)")
     duration = input("Your Input: ")
     return {
-        **state, 
         "duration": duration,
         "current_step": "duration_selected",
-        "messages": state["messages"] + [HumanMessage(content=f"Duration: {duration}")]
+        "messages": [HumanMessage(content=f"Duration: {duration}")]
     }
 
 def input_travel_style(state: PlannerState) -> PlannerState:
     print("🎒 What's your travel style? (adventurous/relaxed/cultural/party/family-friendly)")
     travel_style = input("Your Input: ")
     return {
-        **state, 
         "travel_style": travel_style,
         "current_step": "style_selected",
-        "messages": state["messages"] + [HumanMessage(content=f"Travel style: {travel_style}")]
+        "messages": [HumanMessage(content=f"Travel style: {travel_style}")]
     }
 
 def input_group_details(state: PlannerState) -> PlannerState:
     print("👥 Group size? (solo/couple/small group/large group)")
     group_size = input("Your Input: ")
     return {
-        **state, 
         "group_size": group_size,
         "current_step": "group_selected",
-        "messages": state["messages"] + [HumanMessage(content=f"Group size: {group_size}")]
+        "messages": [HumanMessage(content=f"Group size: {group_size}")]
     }
 
 def input_accommodation(state: PlannerState) -> PlannerState:
     print("🏨 Preferred accommodation? (hostel/hotel/airbnb/luxury resort/camping)")
     accommodation = input("Your Input: ")
     return {
-        **state, 
         "accommodation_type": accommodation,
         "current_step": "accommodation_selected",
-        "messages": state["messages"] + [HumanMessage(content=f"Accommodation: {accommodation}")]
+        "messages": [HumanMessage(content=f"Accommodation: {accommodation}")]
     }
 
 def input_transportation(state: PlannerState) -> PlannerState:
     print("🚗 Preferred transportation? (public transport/rental car/walking/bike/mixed)")
     transportation = input("Your Input: ")
     return {
-        **state, 
         "transportation": transportation,
         "current_step": "transport_selected",
-        "messages": state["messages"] + [HumanMessage(content=f"Transportation: {transportation}")]
+        "messages": [HumanMessage(content=f"Transportation: {transportation}")]
     }
 
 def input_dietary_restrictions(state: PlannerState) -> PlannerState:
     print("🍽️ Any dietary restrictions? (none/vegetarian/vegan/gluten-free/halal/kosher/other)")
     dietary = input("Your Input: ")
     return {
-        **state, 
         "dietary_restrictions": dietary,
         "current_step": "dietary_selected",
-        "messages": state["messages"] + [HumanMessage(content=f"Dietary restrictions: {dietary}")]
+        "messages": [HumanMessage(content=f"Dietary restrictions: {dietary}")]
     }
 
-def create_main_itinerary(state: PlannerState) -> PlannerState:
-    print("\n🔥 Creating your chaotic itinerary...")
-    
-    prompt_vars = {
+def _itinerary_vars(state: PlannerState) -> dict:
+    """Canonical itinerary prompt variables; the CLI and batch states leave skipped answers empty"""
+    return canonical_itinerary_vars({
         "city": state["city"],
-        "interests": ', '.join(state["interests"]),
-        "budget": state.get("budget", "mid-range"),
-        "duration": state.get("duration", "3 days"),
-        "travel_style": state.get("travel_style", "adventurous"),
-        "group_size": state.get("group_size", "solo"),
-        "accommodation_type": state.get("accommodation_type", "hotel"),
-        "transportation": state.get("transportation", "mixed"),
-        "dietary_restrictions": state.get("dietary_restrictions", "none")
-    }
+        "interests": state["interests"],
+        "budget": state.get("budget") or "mid-range",
+        "duration": state.get("duration") or "3 days",
+        "travel_style": state.get("travel_style") or "adventurous",
+        "group_size": state.get("group_size") or "solo",
+        "accommodation_type": state.get("accommodation_type") or "hotel",
+        "transportation": state.get("transportation") or "mixed",
+        "dietary_restrictions": state.get("dietary_restrictions") or "none"
+    })
+
+def create_main_itinerary(state: PlannerState) -> PlannerState:
+    _console("\n🔥 Creating your chaotic itinerary...")
     
-    response = llm.invoke(itinerary_prompt.format_messages(**prompt_vars))
-    itinerary = response.content
+    prompt_vars = _itinerary_vars(state)
     
-    print(f"\n📋 Main Itinerary:\n{itinerary}")
+    _console("\n📋 Main Itinerary:")
+    cache = get_response_cache()
+    key = itinerary_cache_key(prompt_vars)
+    itinerary = cache.get(key)
+    if itinerary is not None:
+        _console(itinerary)
+    else:
+        with producing() as skips:
+            itinerary = _generate_to_console(itinerary_prompt.format_messages(**prompt_vars), "itinerary")
+        if not skips:
+            cache.set(key, itinerary)
     
     return {
-        **state, 
         "itinerary": itinerary,
         "current_step": "itinerary_created",
-        "messages": state["messages"] + [AIMessage(content=itinerary)]
+        "section_inputs": {"create_main_itinerary": input_fingerprint(state, "create_main_itinerary")},
+        "messages": [AIMessage(content=itinerary, name=ITINERARY_MESSAGE)]
     }
 
 def generate_recommendations(state: PlannerState) -> PlannerState:
-    print("\n🎯 Generating specific recommendations...")
+    _console("\n🎯 Generating specific recommendations...")
     
-    response = llm.invoke(recommendations_prompt.format_messages(
-        city=state["city"],
-        interests=', '.join(state["interests"]),
-        budget=state.get("budget", "mid-range"),
-        dietary_restrictions=state.get("dietary_restrictions", "none")
-    ))
+    prompt_vars = _itinerary_vars(state)
+    response = invoke_llm(recommendations_prompt.format_messages(
+        city=prompt_vars["city"],
+        interests=prompt_vars["interests"],
+        budget=prompt_vars["budget"],
+        dietary_restrictions=prompt_vars["dietary_restrictions"]
+    ), "recommendations")
     
     recommendations = response.content.split('\n')
     recommendations = [r.strip() for r in recommendations if r.strip()]
     
-    print(f"\n💡 Recommendations:\n{chr(10).join(recommendations[:5])}")
+    _console(f"\n💡 Recommendations:\n{chr(10).join(recommendations[:5])}")
     
     return {
-        **state, 
         "recommendations": recommendations,
-        "current_step": "recommendations_generated",
-        "messages": state["messages"] + [AIMessage(content=response.content)]
+        "section_inputs": {"generate_recommendations": input_fingerprint(state, "generate_recommendations")},
+        "messages": [AIMessage(content=response.content)]
     }
 
 def generate_local_tips(state: PlannerState) -> PlannerState:
-    print("\n🗝️ Gathering local insider tips...")
+    _console("\n🗝️ Gathering local insider tips...")
     
-    response = llm.invoke(local_tips_prompt.format_messages(city=state["city"]))
-    local_tips = response.content
+    city = canonical_city(state["city"])
+    local_tips = get_response_cache().get_or_create(
+        city_cache_key("local_tips", city),
+        lambda: invoke_llm(local_tips_prompt.format_messages(city=city), "local_tips").content
+    )
     
-    print(f"\n🔍 Local Tips:\n{local_tips}")
+    _console(f"\n🔍 Local Tips:\n{local_tips}")
     
     return {
-        **state, 
         "local_tips": local_tips,
-        "current_step": "tips_generated",
-        "messages": state["messages"] + [AIMessage(content=local_tips)]
+        "section_inputs": {"generate_local_tips": input_fingerprint(state, "generate_local_tips")},
+        "messages": [AIMessage(content=local_tips)]
     }
 
 def generate_safety_info(state: PlannerState) -> PlannerState:
-    print("\n🛡️ Compiling safety information...")
+    _console("\n🛡️ Compiling safety information...")
     
-    response = llm.invoke(safety_prompt.format_messages(city=state["city"]))
-    safety_info = response.content
+    city = canonical_city(state["city"])
+    safety_info = get_response_cache().get_or_create(
+        city_cache_key("safety_info", city),
+        lambda: invoke_llm(safety_prompt.format_messages(city=city), "safety_info").content
+    )
     
-    print(f"\n⚠️ Safety Info:\n{safety_info}")
+    _console(f"\n⚠️ Safety Info:\n{safety_info}")
     
     return {
-        **state, 
         "safety_info": safety_info,
-        "current_step": "safety_generated",
-        "messages": state["messages"] + [AIMessage(content=safety_info)]
+        "section_inputs": {"generate_safety_info": input_fingerprint(state, "generate_safety_info")},
+        "messages": [AIMessage(content=safety_info)]
     }
 
 def create_alternative_plans(state: PlannerState) -> PlannerState:
-    print("\n🔄 Creating alternative plans...")
+    _console("\n🔄 Creating alternative plans...")
+    
+    styles = config.ALTERNATIVE_STYLES
+    interests = ', '.join(state['interests'])
     
-    alternatives = []
-    alternative_styles = ["budget-focused", "luxury", "off-the-beaten-path"]
+    # All styles go out as one bounded-concurrency batch instead of one call per loop
+    responses = (alternative_prompt | RunnableLambda(_invoke_alternative)).batch(
+        [{"style": style, "city": state["city"], "interests": interests} for style in styles],
+        config={"max_concurrency": config.ALTERNATIVE_MAX_CONCURRENCY},
+        return_exceptions=True,
+    )
     
-    for style in alternative_styles:
-        alt_prompt = ChatPromptTemplate.from_messages([
-            ("system", f"Create a {style} alternative itinerary for {state['city']} "
-                      f"based on {', '.join(state['interests'])}. Make it distinct from mainstream tourism."),
-            ("human", "Create an alternative travel plan."),
-        ])
-        
-        response = llm.invoke(alt_prompt.format_messages())
-        alternatives.append(f"**{style.title()} Plan:**\n{response.content}")
+    alternatives = [
+        f"**{style.title()} Plan:**\n{response.content}"
+        for style, response in zip(styles, responses)
+        if not isinstance(response, Exception)
+    ]
     
-    print(f"\n🎲 Alternative Plans Generated: {len(alternatives)} options")
+    _console(f"\n🎲 Alternative Plans Generated: {len(alternatives)} options")
     
     return {
-        **state, 
         "alternative_plans": alternatives,
-        "current_step": "alternatives_created",
-        "messages": state["messages"] + [AIMessage(content=f"Generated {len(alternatives)} alternative plans")]
+        "section_inputs": {"create_alternative_plans": input_fingerprint(state, "create_alternative_plans")},
+        "messages": [AIMessage(content=f"Generated {len(alternatives)} alternative plans")]
     }
 
 def check_satisfaction(state: PlannerState) -> PlannerState:
@@ -242,16 +322,20 @@ def check_satisfaction(state: PlannerState) -> PlannerState:
     is_satisfied = satisfaction in ["yes", "y", "satisfied", "good", "great"]
     needs_refinement = satisfaction in ["no", "modify", "change", "different"]
     
+    # A refinement regenerates sections, so stop once the token budget is spent
+    if needs_refinement and ledger.remaining() == 0:
+        print("⛔ This session has used its token budget, so the plan will be finalized as it is.")
+        needs_refinement = False
+    
     return {
-        **state, 
         "user_satisfaction": is_satisfied,
         "refinement_requested": needs_refinement,
         "current_step": "satisfaction_checked",
-        "messages": state["messages"] + [HumanMessage(content=f"Satisfaction: {satisfaction}")]
+        "messages": [HumanMessage(content=f"Satisfaction: {satisfaction}")]
     }
 
 def refine_itinerary(state: PlannerState) -> PlannerState:
-    print("\n🔧 What would you like to modify? (activities/budget/style/duration/other)")
+    print("\n🔧 What would you like to modify? (activities/budget/style/duration/day N/other)")
     modification = input("Your Input: ")
     
     print(f"Please specify your new preference for {modification}:")
@@ -268,36 +352,60 @@ def refine_itinerary(state: PlannerState) -> PlannerState:
     elif "activities" in modification.lower() or "interests" in modification.lower():
         updates["interests"] = [i.strip() for i in new_preference.split(",")]
     
-    # Regenerate itinerary with new preferences
-    prompt_vars = {
-        "city": state["city"],
-        "interests": ', '.join(updates.get("interests", state["interests"])),
-        "budget": updates.get("budget", state.get("budget", "mid-range")),
-        "duration": updates.get("duration", state.get("duration", "3 days")),
-        "travel_style": updates.get("travel_style", state.get("travel_style", "adventurous")),
-        "group_size": state.get("group_size", "solo"),
-        "accommodation_type": state.get("accommodation_type", "hotel"),
-        "transportation": state.get("transportation", "mixed"),
-        "dietary_restrictions": state.get("dietary_restrictions", "none")
-    }
+    request = HumanMessage(content=f"Requested modification: {modification} -> {new_preference}")
+    
+    # Changes to specific days regenerate just those days
+    days = requested_days(f"{modification} {new_preference}")
+    if days and not updates:
+        print(f"\n✨ Refined Day{'s' if len(days) > 1 else ''} {', '.join(map(str, days))}:")
+        refined_itinerary = _refine_days(state, days, f"{modification}: {new_preference}")
+        if refined_itinerary is not None:
+            return {
+                "itinerary": refined_itinerary,
+                "refinement_requested": False,
+                "current_step": "itinerary_refined",
+                "messages": [request, AIMessage(content=refined_itinerary, name=ITINERARY_MESSAGE)]
+            }
+        print("ℹ️ Those days are not in the current itinerary, regenerating the whole plan.")
     
-    response = llm.invoke(itinerary_prompt.format_messages(**prompt_vars))
-    refined_itinerary = response.content
+    # A changed preference only regenerates the itinerary if it differs from what the
+    # itinerary was built with; free-text requests ("other") always regenerate
+    refined_state = {**state, **updates}
+    if updates and not is_stale(refined_state, "create_main_itinerary"):
+        print("\nℹ️ Nothing the itinerary depends on changed, keeping the current plan.")
+        return {
+            **updates,
+            "refinement_requested": False,
+            "current_step": "itinerary_refined",
+            "messages": [request]
+        }
     
-    print(f"\n✨ Refined Itinerary:\n{refined_itinerary}")
+    messages = itinerary_prompt.format_messages(**_itinerary_vars(refined_state))
+    if not updates:
+        messages.append(HumanMessage(content=f"Also apply this change: {modification}: {new_preference}"))
+    
+    print("\n✨ Refined Itinerary:")
+    refined_itinerary = _generate_to_console(messages, "refine")
     
     return {
-        **state, 
         **updates,
         "itinerary": refined_itinerary,
         "refinement_requested": False,
         "current_step": "itinerary_refined",
-        "messages": state["messages"] + [
-            HumanMessage(content=f"Requested modification: {modification} -> {new_preference}"),
-            AIMessage(content=refined_itinerary)
-        ]
+        "section_inputs": {"create_main_itinerary": input_fingerprint(refined_state, "create_main_itinerary")},
+        "messages": [request, AIMessage(content=refined_itinerary, name=ITINERARY_MESSAGE)]
     }
 
+def compact_context(state: PlannerState) -> PlannerState:
+    """Keep the conversation within CONTEXT_TOKEN_BUDGET during refine loops"""
+    compacted = compact_messages(state["messages"], config.CONTEXT_TOKEN_BUDGET)
+    if compacted is None:
+        return {}
+    
+    _console(f"\n🧹 Compacted conversation from ~{estimate_tokens(state['messages'])} "
+             f"to ~{estimate_tokens(compacted)} tokens")
+    return {"messages": ReplaceMessages(compacted)}
+
 def finalize_plan(state: PlannerState) -> PlannerState:
     print("\n🎉 Finalizing your chaotic travel adventure!")
     print("=" * 50)
@@ -323,7 +431,6 @@ def finalize_plan(state: PlannerState) -> PlannerState:
     print("\n🌟 Have an amazing chaotic adventure!")
     
     return {
-        **state, 
         "current_step": "plan_finalized",
-        "messages": state["messages"] + [AIMessage(content="Travel plan finalized! Ready for adventure!")]
+        "messages": [AIMessage(content="Travel plan finalized! Ready for adventure!")]
     }
\ No newline at end of file